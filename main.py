@@ -1,5 +1,8 @@
+import asyncio
 import uvicorn
 
+from functools import partial
+
 from pytz import utc
 
 from fastapi import FastAPI
@@ -9,10 +12,17 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 from utils.helpers import assign_saturday_duties
+from utils.scheduler import run_scheduled_job, DUTY_ASSIGNMENT_JOB, RECONCILE_TOTALS_JOB
+from src.counters import reconcile_totals
+from utils.background_tasks import fill_absentees, get_absentee_job_name, ACTIVITY_CUTOFFS
+from security.helpers import password_executor
+from src.images import start_image_workers, stop_image_workers
+from utils.roster_cache import roster_cache
+from utils.clock import clock
 
 from contextlib import asynccontextmanager
 
-from routers import duty, staff, auth, learner, attendance
+from routers import duty, staff, auth, learner, attendance, metrics
 
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
@@ -22,6 +32,8 @@ from models.learner import Learners
 from models.staff import Staff
 from utils.models import DefaultDocs
 from models.attendance import Attendance
+from models.image import Images
+from models.scheduler import SchedulerLocks, JobRuns
 
 
 @asynccontextmanager
@@ -29,15 +41,40 @@ async def lifespan(app: FastAPI):
     client = AsyncIOMotorClient("mongodb://localhost:27017")     # * Connect to MongoDB
     
     #* Create a scheduler to assign duties to learners every Saturday at midnight
-    scheduler = AsyncIOScheduler()
+    scheduler = AsyncIOScheduler(timezone=clock.timezone)
     trigger = CronTrigger(hour=3, minute=15)
     
-    scheduler.add_job(assign_saturday_duties, trigger)
+    #* Every worker schedules the job, only the first to lock each run executes it
+    scheduler.add_job(run_scheduled_job, trigger, args=[DUTY_ASSIGNMENT_JOB, assign_saturday_duties])
+    
+    #* Correct any drift in the learner and participant counters daily
+    scheduler.add_job(run_scheduled_job, CronTrigger(hour=2, minute=45), args=[RECONCILE_TOTALS_JOB, reconcile_totals])
+    
+    #* Once roll call for an activity closes, everyone not marked is recorded as absent
+    for activity, cutoff in ACTIVITY_CUTOFFS.items():
+        scheduler.add_job(
+            run_scheduled_job,
+            CronTrigger(**cutoff),
+            args=[get_absentee_job_name(activity), partial(fill_absentees, activity)]
+        )
     
-    await init_beanie(database=client["hostelManagement"], document_models=[Duties, Learners, Staff, DefaultDocs, AssignedDuties, Attendance])
+    #* Indexes declared in each model's Settings are created here, the migrations drop the ones they replace
+    await init_beanie(
+        database=client["hostelManagement"],
+        document_models=[Duties, Learners, Staff, DefaultDocs, AssignedDuties, Attendance, Images, SchedulerLocks, JobRuns]
+    )
     scheduler.start()
+    start_image_workers()
+    
+    #* Warm the learner roster, then keep it current from a change stream where the server supports one
+    await roster_cache.load()
+    roster_watch = asyncio.create_task(roster_cache.watch())
+    
     yield
+    roster_watch.cancel()
     scheduler.shutdown()
+    password_executor.shutdown(wait=False)
+    stop_image_workers()
     client.close()
     
 
@@ -61,6 +98,7 @@ app.include_router(duty.router)
 app.include_router(learner.router)
 app.include_router(auth.router)
 app.include_router(attendance.router)
+app.include_router(metrics.router)
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,65 @@
+"""Moves the profile images embedded in `Learners` and `Staff` documents into
+the `Images` store, replacing each image with its key.
+
+Run with:
+    beanie migrate -uri mongodb://localhost:27017 -db hostelManagement -p migrations --no-use-transaction
+"""
+
+import hashlib
+from io import BytesIO
+
+from PIL import Image, UnidentifiedImageError
+
+from beanie import free_fall_migration
+
+from models.image import Images
+from models.learner import Learners
+from models.staff import Staff
+
+
+def guess_content_type(data: bytes) -> str:
+    '''Returns the media type of the image in `data`, defaulting to JPEG'''
+    try:
+        with Image.open(BytesIO(data)) as image:
+            return Image.MIME.get(image.format, "image/jpeg")
+    except UnidentifiedImageError:
+        return "image/jpeg"
+
+
+class Forward:
+    @free_fall_migration(document_models=[Images, Learners, Staff])
+    async def move_images_to_image_store(self, session):
+        images = Images.get_motor_collection()
+
+        for model in (Learners, Staff):
+            collection = model.get_motor_collection()
+
+            #* Only documents still holding the raw image bytes need moving
+            async for document in collection.find({"image": {"$type": "binData"}}, {"image": 1}, session=session):
+                data = bytes(document["image"])
+                key = hashlib.sha256(data).hexdigest()
+
+                await images.update_one(
+                    {"_id": key},
+                    {"$setOnInsert": {"data": data, "content_type": guess_content_type(data)}},
+                    upsert=True,
+                    session=session
+                )
+                await collection.update_one({"_id": document["_id"]}, {"$set": {"image": key}}, session=session)
+
+
+class Backward:
+    @free_fall_migration(document_models=[Images, Learners, Staff])
+    async def embed_images_in_documents(self, session):
+        images = Images.get_motor_collection()
+
+        for model in (Learners, Staff):
+            collection = model.get_motor_collection()
+
+            async for document in collection.find({"image": {"$type": "string"}}, {"image": 1}, session=session):
+                image = await images.find_one({"_id": document["image"]}, session=session)
+
+                if not image:
+                    continue
+
+                await collection.update_one({"_id": document["_id"]}, {"$set": {"image": image["data"]}}, session=session)
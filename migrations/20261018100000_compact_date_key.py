@@ -0,0 +1,53 @@
+"""Replaces the `week_day`, `day`, `month` and `year` fields of `Attendance`
+and `AssignedDuties` with a single `date` field holding the date at midnight.
+
+Indexes built on the old fields are dropped first, the application recreates
+the indexes declared on the models when it starts.
+
+Run with:
+    beanie migrate -uri mongodb://localhost:27017 -db hostelManagement -p migrations --no-use-transaction
+"""
+
+from beanie import free_fall_migration
+
+from utils.migrations import AttendanceRows, AssignedDutiesRows, drop_secondary_indexes
+
+
+class Forward:
+    @free_fall_migration(document_models=[AttendanceRows, AssignedDutiesRows])
+    async def backfill_date_key(self, session):
+        for model in (AttendanceRows, AssignedDutiesRows):
+            collection = model.get_motor_collection()
+            
+            await drop_secondary_indexes(collection, session)
+            await collection.update_many(
+                {"date": {"$exists": False}},
+                [
+                    {"$set": {"date": {"$dateFromParts": {"year": "$year", "month": "$month", "day": "$day"}}}},
+                    {"$unset": ["week_day", "day", "month", "year"]},
+                ],
+                session=session
+            )
+
+
+class Backward:
+    @free_fall_migration(document_models=[AttendanceRows, AssignedDutiesRows])
+    async def split_date_key(self, session):
+        for model in (AttendanceRows, AssignedDutiesRows):
+            collection = model.get_motor_collection()
+            
+            await drop_secondary_indexes(collection, session)
+            await collection.update_many(
+                {"date": {"$exists": True}},
+                [
+                    {"$set": {
+                        #* Python's weekday counts from Monday = 0
+                        "week_day": {"$subtract": [{"$isoDayOfWeek": "$date"}, 1]},
+                        "day": {"$dayOfMonth": "$date"},
+                        "month": {"$month": "$date"},
+                        "year": {"$year": "$date"},
+                    }},
+                    {"$unset": "date"},
+                ],
+                session=session
+            )
@@ -0,0 +1,55 @@
+"""Re-encodes every image in the `Images` store in each of `IMAGE_SIZES`,
+replacing the original upload with one document per size.
+
+Images that cannot be decoded are kept as uploaded under every size.
+
+Run with:
+    beanie migrate -uri mongodb://localhost:27017 -db hostelManagement -p migrations --no-use-transaction
+"""
+
+from beanie import free_fall_migration
+
+from models.image import Images
+from src.images import IMAGE_SIZES, IMAGE_CONTENT_TYPE, DEFAULT_IMAGE_SIZE, InvalidImageError, render_image, get_image_id
+
+
+class Forward:
+    @free_fall_migration(document_models=[Images])
+    async def render_image_sizes(self, session):
+        images = Images.get_motor_collection()
+
+        #* Only originals are keyed by the bare digest, sized documents have a `:size` suffix
+        async for image in images.find({"_id": {"$not": {"$regex": ":"}}}, session=session):
+            try:
+                renditions = {size: (data, IMAGE_CONTENT_TYPE) for size, data in render_image(image["data"]).items()}
+            except InvalidImageError:
+                renditions = {size: (image["data"], image["content_type"]) for size in IMAGE_SIZES}
+
+            for size, (data, content_type) in renditions.items():
+                await images.update_one(
+                    {"_id": get_image_id(image["_id"], size)},
+                    {"$setOnInsert": {"data": data, "content_type": content_type}},
+                    upsert=True,
+                    session=session
+                )
+
+            await images.delete_one({"_id": image["_id"]}, session=session)
+
+
+class Backward:
+    @free_fall_migration(document_models=[Images])
+    async def keep_largest_size(self, session):
+        images = Images.get_motor_collection()
+
+        #* The original uploads are gone, the largest size takes their place
+        async for image in images.find({"_id": {"$regex": f":{DEFAULT_IMAGE_SIZE}$"}}, session=session):
+            key = image["_id"].rsplit(":", 1)[0]
+
+            await images.update_one(
+                {"_id": key},
+                {"$setOnInsert": {"data": image["data"], "content_type": image["content_type"]}},
+                upsert=True,
+                session=session
+            )
+
+        await images.delete_many({"_id": {"$regex": ":"}}, session=session)
@@ -0,0 +1,62 @@
+"""Replaces the `learner_details` snapshot embedded in every `Attendance` and
+`AssignedDuties` row with a compact `learner` reference holding only the
+learner's ObjectId and block. Names are resolved when rows are read.
+
+Indexes built on the old fields are dropped first, the application recreates
+the indexes declared on the models when it starts.
+
+Run with:
+    beanie migrate -uri mongodb://localhost:27017 -db hostelManagement -p migrations --no-use-transaction
+"""
+
+from beanie import free_fall_migration
+
+from models.learner import Learners
+
+from utils.migrations import AttendanceRows, AssignedDutiesRows, drop_secondary_indexes
+
+
+class Forward:
+    @free_fall_migration(document_models=[AttendanceRows, AssignedDutiesRows])
+    async def compact_learner_reference(self, session):
+        for model in (AttendanceRows, AssignedDutiesRows):
+            collection = model.get_motor_collection()
+
+            await drop_secondary_indexes(collection, session)
+            await collection.update_many(
+                {"learner_details": {"$exists": True}},
+                [
+                    {"$set": {"learner": {
+                        "id": {"$toObjectId": "$learner_details.id"},
+                        "block": "$learner_details.block",
+                    }}},
+                    {"$unset": "learner_details"},
+                ],
+                session=session
+            )
+
+
+class Backward:
+    @free_fall_migration(document_models=[AttendanceRows, AssignedDutiesRows, Learners])
+    async def embed_learner_details(self, session):
+        for model in (AttendanceRows, AssignedDutiesRows):
+            collection = model.get_motor_collection()
+
+            await drop_secondary_indexes(collection, session)
+
+            #* Details come from the learner as they are now, the block stays as recorded
+            await collection.aggregate([
+                {"$match": {"learner": {"$exists": True}}},
+                {"$lookup": {
+                    "from": Learners.get_motor_collection().name,
+                    "localField": "learner.id",
+                    "foreignField": "_id",
+                    "as": "details"
+                }},
+                {"$set": {"learner_details": {"$mergeObjects": [
+                    {"$first": "$details"},
+                    {"id": {"$toString": "$learner.id"}, "block": "$learner.block"},
+                ]}}},
+                {"$unset": ["details", "learner", "learner_details._id", "learner_details.image", "learner_details.present", "learner_details.revision_id"]},
+                {"$merge": {"into": collection.name, "on": "_id", "whenMatched": "replace"}},
+            ], session=session).to_list(None)
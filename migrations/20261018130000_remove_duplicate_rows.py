@@ -0,0 +1,43 @@
+"""Deletes duplicate `Attendance` and `AssignedDuties` rows so their unique
+indexes can be built when the application starts.
+
+Attendance marked concurrently before the index existed could be stored twice,
+the most recently marked row of each learner, activity and date is kept. The
+duty job ran on every worker and assigned learners more than once a day, the
+first completed assignment of each learner and date is kept, otherwise the
+first assigned.
+
+Deleted rows are not restored when migrating backward.
+
+Run with:
+    beanie migrate -uri mongodb://localhost:27017 -db hostelManagement -p migrations --no-use-transaction
+"""
+
+import logging
+
+from beanie import free_fall_migration
+
+from utils.migrations import AttendanceRows, AssignedDutiesRows, remove_duplicates
+
+
+logger = logging.getLogger(__name__)
+
+
+class Forward:
+    @free_fall_migration(document_models=[AttendanceRows, AssignedDutiesRows])
+    async def remove_duplicate_rows(self, session):
+        removed = await remove_duplicates(
+            AttendanceRows.get_motor_collection(),
+            keys=["learner.id", "activity", "date"],
+            keep={"_id": -1},
+            session=session
+        )
+        logger.info("Removed %d duplicate attendance rows", removed)
+
+        removed = await remove_duplicates(
+            AssignedDutiesRows.get_motor_collection(),
+            keys=["learner.id", "date"],
+            keep={"completed": -1, "_id": 1},
+            session=session
+        )
+        logger.info("Removed %d duplicate duty assignments", removed)
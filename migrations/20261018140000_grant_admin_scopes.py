@@ -0,0 +1,34 @@
+"""Grants the `get-m` and `run-d` scopes to staff accounts created before they
+existed. New chief matron and super user accounts are given them when created.
+
+Run with:
+    beanie migrate -uri mongodb://localhost:27017 -db hostelManagement -p migrations --no-use-transaction
+"""
+
+from beanie import free_fall_migration
+
+from models.staff import Staff
+
+
+ADMIN_ROLES = ["chief-matron", "super-user"]
+ADMIN_SCOPES = ["get-m", "run-d"]
+
+
+class Forward:
+    @free_fall_migration(document_models=[Staff])
+    async def grant_admin_scopes(self, session):
+        await Staff.get_motor_collection().update_many(
+            {"role": {"$in": ADMIN_ROLES}},
+            {"$addToSet": {"permissions": {"$each": ADMIN_SCOPES}}},
+            session=session
+        )
+
+
+class Backward:
+    @free_fall_migration(document_models=[Staff])
+    async def revoke_admin_scopes(self, session):
+        await Staff.get_motor_collection().update_many(
+            {"role": {"$in": ADMIN_ROLES}},
+            {"$pull": {"permissions": {"$in": ADMIN_SCOPES}}},
+            session=session
+        )
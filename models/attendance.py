@@ -1,18 +1,39 @@
+from datetime import datetime
+
 from beanie import Document, PydanticObjectId
+from pymongo import IndexModel, ASCENDING
 
 from typing import Annotated, Literal
 from pydantic import Field, field_serializer
 
+from models.learner import LearnerRef
+
 
 class Attendance(Document):
     activity: Annotated[Literal["evening-study", "afternoon-study", "church", "supper", "breakfast"], Field(description="The activity attendance is being taken for")]
-    learner_details: dict
+    learner: Annotated[LearnerRef, Field(description="The learner attendance was taken for")]
     present: bool = False #* Mark whether learner is present or absent for activity 
-    week_day: int
-    day: int 
-    month: int
-    year: int
+    date: Annotated[datetime, Field(description="Date the attendance was taken, at midnight")]
     
     @field_serializer("id")
     def convert_pydantic_object_id_to_string(self, id:PydanticObjectId) -> str:
-        return str(id)
\ No newline at end of file
+        return str(id)
+    
+    class Settings:
+        indexes = [
+            #* A learner can only have one attendance record per activity per day
+            IndexModel(
+                [("learner.id", ASCENDING), ("activity", ASCENDING), ("date", ASCENDING)],
+                name="learner_activity_date",
+                unique=True
+            ),
+            IndexModel(
+                [("date", ASCENDING), ("learner.block", ASCENDING)],
+                name="date_block"
+            ),
+            #* Pages of GET /attendance are sorted by date then _id, the block is filtered on the index
+            IndexModel(
+                [("date", ASCENDING), ("_id", ASCENDING), ("learner.block", ASCENDING)],
+                name="date_id_block"
+            ),
+        ]
\ No newline at end of file
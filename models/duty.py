@@ -1,10 +1,15 @@
 """### Contains all `Learner` models
 """
+from datetime import datetime
+
 from beanie import Document, PydanticObjectId
+from pymongo import IndexModel, ASCENDING
 
 from typing import Annotated, Literal
 from pydantic import Field, field_serializer
 
+from models.learner import LearnerRef
+
 
 class Duties(Document):
     id: Annotated[str, Field(description="The name of the duty",min_length=6, max_length=50)]
@@ -13,14 +18,25 @@ class Duties(Document):
     
     
 class AssignedDuties(Document):
-    learner_details: Annotated[dict, Field(description="Details of the learner")]
+    learner: Annotated[LearnerRef, Field(description="The learner assigned the duty")]
     assigned_duty: Annotated[str, Field(description="Duty assigned to the learner")]
-    week_day: Annotated[int, Field("Day of the week the duty was assigned")]
-    day: Annotated[int, Field(description="Day of the month the duty was assigned")]
-    month: Annotated[int, Field(description="Month the duty was assigned")]
-    year: Annotated[int, Field(description="Year the duty was assigned")]
+    date: Annotated[datetime, Field(description="Date the duty was assigned, at midnight")]
     completed: Annotated[bool, Field(description="Indicates if the duty has been completed")]
     
     @field_serializer("id")
     def convert_pydantic_object_id_to_string(self, id:PydanticObjectId):
-        return str(id)
\ No newline at end of file
+        return str(id)
+    
+    class Settings:
+        indexes = [
+            #* A learner can only be assigned one duty per day
+            IndexModel(
+                [("learner.id", ASCENDING), ("date", ASCENDING)],
+                name="learner_date",
+                unique=True
+            ),
+            IndexModel(
+                [("date", ASCENDING), ("learner.block", ASCENDING)],
+                name="date_block"
+            ),
+        ]
\ No newline at end of file
@@ -0,0 +1,13 @@
+"""### Contains the `Images` model
+"""
+
+from beanie import Document
+
+from typing import Annotated
+from pydantic import Field
+
+
+class Images(Document):
+    id: Annotated[str, Field(description="SHA-256 digest of the uploaded image followed by the size, e.g. `<digest>:thumbnail`")]
+    data: Annotated[bytes, Field(description="The binary image data")]
+    content_type: Annotated[str, Field(description="Media type of the image", examples=["image/webp"])]
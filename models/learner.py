@@ -2,10 +2,11 @@
 """
 
 from beanie import Document, PydanticObjectId
+from pymongo import IndexModel, ASCENDING
 from utils.models import UserBaseModel
 
 from typing import Annotated, Literal
-from pydantic import Field, field_serializer
+from pydantic import BaseModel, ConfigDict, Field, field_serializer
 
 
 class Learners(Document, UserBaseModel):
@@ -17,4 +18,47 @@ class Learners(Document, UserBaseModel):
     
     @field_serializer("id")
     def convert_pydantic_object_id_to_string(self, id:PydanticObjectId):
-        return str(id)
\ No newline at end of file
+        return str(id)
+    
+    class Settings:
+        indexes = [
+            IndexModel([("block", ASCENDING)], name="block"),
+            IndexModel([("present", ASCENDING)], name="present"),
+        ]
+
+
+class LearnerSummary(BaseModel):
+    """
+    Projection of `Learners` with only the fields rosters, duty scheduling
+    and attendance need, the image key and document metadata are not fetched
+    """
+    model_config = ConfigDict(populate_by_name=True)
+    
+    id: Annotated[PydanticObjectId, Field(alias="_id")]
+    first_name: str
+    last_name: str
+    grade: int
+    room: int
+    block: Literal["A", "B", "C", "D"]
+    present: bool = True
+    last_duty: str = ""
+    
+    @field_serializer("id")
+    def convert_pydantic_object_id_to_string(self, id:PydanticObjectId):
+        return str(id)
+
+
+
+class LearnerImageRef(BaseModel):
+    """Projection of `Learners` with only what serving their image needs"""
+    block: Literal["A", "B", "C", "D"]
+    image: str
+
+
+class LearnerRef(BaseModel):
+    """
+    Compact reference to a learner stored in `Attendance` and `AssignedDuties`,
+    names are resolved when the rows are read
+    """
+    id: Annotated[PydanticObjectId, Field(description="The `_id` of the learner")]
+    block: Annotated[Literal["A", "B", "C", "D"], Field(description="The block the learner was in")]
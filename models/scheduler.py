@@ -0,0 +1,47 @@
+"""### Contains the models used to coordinate scheduled jobs
+"""
+
+from datetime import datetime
+
+from beanie import Document, PydanticObjectId
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+from typing import Annotated, Literal
+from pydantic import Field, field_serializer
+
+
+class SchedulerLocks(Document):
+    id: Annotated[str, Field(description="Name of the lock, a job name and the run it is for")]
+    owner: Annotated[str, Field(description="The worker holding the lock")]
+    acquired_at: Annotated[datetime, Field(description="When the lock was acquired")]
+    expires_at: Annotated[datetime, Field(description="When the lock is released if its owner does not release it")]
+    
+    class Settings:
+        indexes = [
+            #* MongoDB removes locks once they expire
+            IndexModel([("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0),
+        ]
+
+
+class JobRuns(Document):
+    job: Annotated[str, Field(description="Name of the job that ran")]
+    run_key: Annotated[str, Field(description="Identifies the scheduled run, only one worker executes each")]
+    owner: Annotated[str, Field(description="The worker that executed the run")]
+    trigger: Annotated[Literal["schedule", "manual"], Field(description="Whether the run was scheduled or triggered by a user")] = "schedule"
+    dry_run: Annotated[bool, Field(description="Dry runs plan the job without saving its results")] = False
+    status: Annotated[Literal["running", "succeeded", "skipped", "failed"], Field(description="Outcome of the run")] = "running"
+    message: Annotated[str, Field(description="Why the run was skipped or failed")] = ""
+    learners_assigned: Annotated[int, Field(description="Number of learners assigned duties by the run")] = 0
+    timings: Annotated[dict[str, float], Field(description="Seconds spent per phase of the run")] = {}
+    started_at: Annotated[datetime, Field(description="When the run started")]
+    finished_at: Annotated[datetime | None, Field(description="When the run finished")] = None
+    duration_seconds: Annotated[float | None, Field(description="How long the run took")] = None
+    
+    @field_serializer("id")
+    def convert_pydantic_object_id_to_string(self, id:PydanticObjectId):
+        return str(id)
+    
+    class Settings:
+        indexes = [
+            IndexModel([("job", ASCENDING), ("started_at", DESCENDING)], name="job_started_at"),
+        ]
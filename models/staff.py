@@ -1,7 +1,7 @@
 from beanie import Document
 
 from typing import Annotated, Literal
-from pydantic import Field
+from pydantic import BaseModel, Field
 
 from utils.models import UserBaseModel
 
@@ -12,4 +12,10 @@ class Staff(Document, UserBaseModel):
     role: Annotated[Literal["jr-matron", "sr-matron", "super-user", "chief-matron"], Field()]
     active: Annotated[bool, Field(description="bool field to mark if user account is active")] = True
     present: Annotated[bool, Field(description="Marks if the staff member is present at work")] = True
-    permissions: Annotated[list, Field(description="A list of permissions the staff member has")]
\ No newline at end of file
+    permissions: Annotated[list, Field(description="A list of permissions the staff member has")]
+
+
+class StaffImageRef(BaseModel):
+    """Projection of `Staff` with only what serving their image needs"""
+    role: Literal["jr-matron", "sr-matron", "super-user", "chief-matron"]
+    image: str
@@ -1,133 +1,58 @@
+import json
 from bson.errors import InvalidId
 
-from datetime import datetime
+from datetime import date, timedelta
 
-from beanie import PydanticObjectId
-from beanie.operators import And
+from fastapi import APIRouter, Security, status, HTTPException, Query, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from fastapi import APIRouter, Security, status, HTTPException, Query
-from fastapi.responses import JSONResponse
+from pymongo import ASCENDING
 
 from typing import Annotated, Literal
 from pydantic import ValidationError, Field
 
 
 from security.helpers import get_current_active_user
+from security.schemas import StaffPrincipal
+from security.policy import get_block_policy
 
+from utils.helpers import get_date_query, get_page_cursor, get_page_query
+from utils.roster_cache import roster_cache
+from utils.clock import Clock, get_clock
+
+from src.attendance import mark_attendance_in_bulk, get_attendance_report
 
 from pprint import pprint
 
 from schemas.attendance import MarkAttendance
 
-from models.learner import Learners
 from models.attendance import Attendance
-from models.staff import Staff
 
 
 router = APIRouter(
     prefix='/api/v1/attendance',
     tags=['Attendance']
 )
-current_date = datetime.now()
+
 
 @router.post("")
-async def mark_attendance(request: MarkAttendance, current_user: Annotated[Staff, Security(get_current_active_user, scopes=["mark-a"])]):
+async def mark_attendance(request: MarkAttendance, current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["mark-a"])], clock: Annotated[Clock, Depends(get_clock)]):
     """Marks `present` True for `activity` for all learners who's IDs are in `present_learner` and False for those not in `present_learners`"""
     try:
-        user_role = current_user.role
-        
-        if request.present_learners:
-            present_learners = [await Learners.get(PydanticObjectId(learner_id)) for learner_id in request.present_learners]        
-            
-            for learner in present_learners:
-                
-                #* Skip None values for non existent IDs
-                if not learner:
-                    continue
-                
-                block = learner.block
-                
-                #* Ensure user's mark attendance for their designated blocks
-                if not learner or (user_role == "jr-matron" and (block == "C" or block == "D")) or (user_role == "sr-matron" and (block == "A" or block == "B")):
-                    continue
-                
-                learner_already_marked = await Attendance.find_one(And(
-                    Attendance.learner_details.id == str(learner.id),
-                    Attendance.day == current_date.day,
-                    Attendance.week_day == current_date.weekday(),
-                    Attendance.month == current_date.month,
-                    Attendance.activity == request.activity,
-                ))
-                
-                if learner_already_marked:
-
-                    #* Skip None values for learner IDs not found in DB and learners already marked present
-                    if not learner or learner_already_marked.present == True:
-                        continue
-                    elif learner_already_marked.present == False:
-                        #* If learner was marked absent, mark present and move on to next
-                        learner_already_marked.present = True
-                        await learner_already_marked.save()
-                        continue
-                
-                attendance = Attendance(
-                    activity=request.activity,
-                    day=current_date.day,
-                    week_day=current_date.weekday(),
-                    month=current_date.month,
-                    year=current_date.year,
-                    present=True,
-                    learner_details=learner.model_dump(exclude=["present", "image"])
-                )
-                
-                await attendance.save()
-                        
-        if request.absent_learners:
-            absent_learners = [await Learners.get(PydanticObjectId(learner_id)) for learner_id in request.absent_learners]
-            
-            for learner in absent_learners:
-                block = learner.block
-                
-                #* Skip None values for non existent IDs and
-                #* Ensure user's mark attendance for their designated blocks
-                if not learner or (user_role == "jr-matron" and (block == "C" or block == "D")) or (user_role == "sr-matron" and (block == "A" or block == "B")):
-                    continue                
-                
-                learner_already_marked = await Attendance.find_one(And(
-                    Attendance.learner_details.id == str(learner.id),
-                    Attendance.day == current_date.day,
-                    Attendance.week_day == current_date.weekday(),
-                    Attendance.month == current_date.month,
-                    Attendance.activity == request.activity
-                ))
-                
-                if learner_already_marked:                
-                    #* Skip None values for learner IDs not found in DB and learners already marked absent
-                    if not learner or learner_already_marked.present == False:
-                        continue
-                    elif learner_already_marked.present == True:
-                        #* If learner was marked present, mark absent and move on to next
-                        learner_already_marked.present = False
-                        await learner_already_marked.save()
-                        continue
-                
-                attendance = Attendance(
-                    activity=request.activity,
-                    day=current_date.day,
-                    week_day=current_date.weekday(),
-                    month=current_date.month,
-                    year=current_date.year,
-                    present=False,
-                    learner_details=learner.model_dump(exclude=["present", "image"])
-                )
-                
-                await attendance.save()
+        outcomes = await mark_attendance_in_bulk(
+            activity=request.activity,
+            present_learners=request.present_learners,
+            absent_learners=request.absent_learners,
+            policy=get_block_policy(current_user),
+            date_key=clock.date_key()
+        )
          
         return JSONResponse(
             status_code=status.HTTP_200_OK,
             content={
                 "status": "success",
-                "message": f"Attendance marked for {request.activity}"
+                "message": f"Attendance marked for {request.activity}",
+                "detail": outcomes.model_dump()
             }
         )
     except ConnectionError:
@@ -150,69 +75,77 @@ async def mark_attendance(request: MarkAttendance, current_user: Annotated[Staff
 
 @router.get("")
 async def get_attendance(
-    current_user: Annotated[Staff, Security(get_current_active_user, scopes=["get-a"])],
+    current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["get-a"])],
+    clock: Annotated[Clock, Depends(get_clock)],
     activity: Annotated[Literal["evening-study", "afternoon-study", "church", "supper", "breakfast"] | None, Query(description="Activity that attendance was taken for")] = None,
     day: Annotated[int | None, Query(description="Day of the month attendance was taken", ge=1, le=31)] = None,
     weekday: Annotated[int | None, Query(description="Day of the week attendance was taken", ge=0, le=6)] = None,
     month: Annotated[int | None, Query(description="Month attendance was taken", ge=1, le=12)] = None,
-    year: Annotated[int | None, Query(description="Year attendance for the activity was taken")] = None
+    year: Annotated[int | None, Query(description="Year attendance for the activity was taken")] = None,
+    start: Annotated[date | None, Query(description="Earliest date attendance was taken, inclusive")] = None,
+    end: Annotated[date | None, Query(description="Latest date attendance was taken, inclusive")] = None,
+    limit: Annotated[int | None, Query(description="Maximum number of documents returned, defaults to 100 unless streaming", ge=1, le=1000)] = None,
+    after: Annotated[str | None, Query(description="The `next` value of the previous page, resumes after its last document")] = None,
+    format: Annotated[Literal["json", "ndjson"], Query(description="`ndjson` streams one document per line as they are read")] = "json"
 ):
     """Returns all Attendance documents matching query parameters. If no query parameters
        provided, all attendance taken for all activities on the day is returned
     """
-    query_params = [activity, day, weekday, month, year]
-    query_values = {}
-    user_role = current_user.role
+    try:
+        query_values = get_date_query(day=day, weekday=weekday, month=month, year=year, start=start, end=end)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                "status": "failed",
+                "message": "The date provided does not exist"
+            }
+        )
     
-    for query_param in query_params:
-        if not query_param:
-            continue
-        
-        param_index = query_params.index(query_param)
-        
-        if param_index == 0:
-            query_values.update({"activity": query_param})
-        elif param_index == 1:
-            query_values.update({"day": query_param})
-        elif param_index == 2:
-            query_values.update({"week_day": query_param})
-        elif param_index == 3:
-            query_values.update({"month": query_param})
-        elif param_index == 4:
-            query_values.update({"year": query_param})
-
-    if not query_values:
-        attendances = await Attendance.find(
-            Attendance.day == current_date.day,
-            Attendance.month == current_date.month,
-            Attendance.year == current_date.year
-        ).to_list()
+    if activity:
+        query_values.update({"activity": activity})
+    
+    queried_for_the_day = not query_values
+    
+    if queried_for_the_day:
+        query_values.update({"date": clock.date_key()})
+    
+    #* Ensure user's get attendance for their designated blocks
+    query_values.update(get_block_policy(current_user).filter("learner.block"))
+    
+    if after:
+        try:
+            query_values.update(get_page_query(after))
+        except (ValueError, InvalidId):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={
+                    "status": "failed",
+                    "message": "Invalid value provided for after"
+                }
+            )
+    
+    #* Sorted the way the `date_id_block` index is, so pages are read in index order
+    attendances = Attendance.find(query_values).sort([("date", ASCENDING), ("_id", ASCENDING)])
+    
+    if format == "ndjson":
+        if limit:
+            attendances = attendances.limit(limit)
         
-        serialized_attendance = []
+        await roster_cache.ensure_loaded()
         
-        for attendance in attendances:
-            block = attendance.learner_details.get("block")
-            
-            #* Skip None values for non existent IDs and
-            #* Ensure user's get attendance for their designated blocks
-            if (user_role == "jr-matron" and (block == "C" or block == "D")) or (user_role == "sr-matron" and (block == "A" or block == "B")):
-                continue
-            
-            serialized_attendance.append(attendance.model_dump())
+        async def stream_attendance():
+            async for attendance in attendances:
+                yield json.dumps(roster_cache.expand(attendance.model_dump(mode="json"))) + "\n"
         
-        return JSONResponse(
-            status_code=status.HTTP_200_OK,
-            content={
-                "status": "success",
-                "message": "Retrieved attendance taken for all activities for the day",
-                "detail": serialized_attendance
-            }
-        )
+        return StreamingResponse(stream_attendance(), media_type="application/x-ndjson")
     
-    attendances = await Attendance.find(query_values).to_list()
-    serialized_attendance = []
+    limit = limit or 100
+    await roster_cache.ensure_loaded()
+    attendances = await attendances.limit(limit).to_list()
+    serialized_attendance = [roster_cache.expand(attendance.model_dump(mode="json")) for attendance in attendances]
             
-    if not attendances:
+    if not serialized_attendance and not (queried_for_the_day or after):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail={
@@ -220,15 +153,59 @@ async def get_attendance(
                 "message": "No attendance matching your query was found"
             }
         )
-        
-    for attendance in attendances:
-        block = attendance.learner_details.get("block")
-        
-        #* Skip None values for non existent IDs and
-        #* Ensure user's get attendance for their designated blocks
-        if (user_role == "jr-matron" and (block == "C" or block == "D")) or (user_role == "sr-matron" and (block == "A" or block == "B")):
-            continue
-        
-        serialized_attendance.append(attendance)
     
-    return {"details": serialized_attendance}
\ No newline at end of file
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "status": "success",
+            "message": "Retrieved attendance taken for all activities for the day" if queried_for_the_day else "Retrieved attendance matching your query",
+            "detail": serialized_attendance,
+            #* Pass as `after` to get the next page, None once there are no more documents
+            "next": get_page_cursor(attendances[-1].date, attendances[-1].id) if len(attendances) == limit else None
+        }
+    )
+
+
+
+@router.get("/report")
+async def get_attendance_report_for_range(
+    current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["get-a"])],
+    clock: Annotated[Clock, Depends(get_clock)],
+    group_by: Annotated[Literal["learner", "block", "activity"], Query(description="What present and absent counts are reported per")] = "learner",
+    activity: Annotated[Literal["evening-study", "afternoon-study", "church", "supper", "breakfast"] | None, Query(description="Only count attendance taken for this activity")] = None,
+    start: Annotated[date | None, Query(description="Earliest date counted, inclusive, defaults to 30 days before `end`")] = None,
+    end: Annotated[date | None, Query(description="Latest date counted, inclusive, defaults to today")] = None
+):
+    """Returns present and absent counts and percentages per learner, block or activity
+       for attendance taken between `start` and `end`, computed by the database
+    """
+    end = end or clock.today()
+    start = start or end - timedelta(days=29)
+    
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                "status": "failed",
+                "message": "start must not be after end"
+            }
+        )
+    
+    match = get_date_query(start=start, end=end)
+    
+    #* Ensure user's only get reports for their designated blocks
+    match.update(get_block_policy(current_user).filter("learner.block"))
+    
+    if activity:
+        match.update({"activity": activity})
+    
+    report = await get_attendance_report(group_by, match)
+    
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "status": "success",
+            "message": f"Attendance per {group_by} from {start} to {end}",
+            "detail": report
+        }
+    )
@@ -1,30 +1,37 @@
 from pprint import pprint
-from datetime import datetime
+from bson.errors import InvalidId
+from functools import partial
+from datetime import timedelta
 
 from pymongo.errors import DuplicateKeyError, ConnectionFailure
 
-from fastapi import APIRouter, Query,Security, status, HTTPException, Path, Body, BackgroundTasks
+from fastapi import APIRouter, Query,Security, status, HTTPException, Path, Body, BackgroundTasks, Depends
 from fastapi.responses import JSONResponse
 
 from typing import Annotated
 from pydantic import ValidationError, Field
-from beanie import PydanticObjectId
-
-from beanie.operators import And
 
 from security.helpers import get_current_active_user
+from security.schemas import StaffPrincipal
+from security.policy import get_block_policy
 
-from utils.helpers import assign_duties_to_learners
+from utils.helpers import assign_duties_to_learners, assign_saturday_duties
+from utils.duty_planner import UnsatisfiableDutiesError
+from utils.scheduler import acquire_lock, release_lock, record_job_run, DUTY_ASSIGNMENT_JOB
 from utils.schemas import GenericResponse
+from utils.roster_cache import roster_cache
+from utils.clock import Clock, get_clock
+
+from src.counters import reserve_participants, increment_total, TOTAL_PARTICIPANTS
+from src.duties import mark_duties_completed
 
 from schemas.duty import NewDuty, SpecialDuties, NewDutyResponse, GetAssignedDutiesResponse
 
 from models.duty import Duties
-from utils.models import DefaultDocs
 from models.duty import AssignedDuties
-from models.staff import Staff
+from models.scheduler import JobRuns
 
-from models.learner import Learners
+from models.learner import Learners, LearnerSummary
 
 router = APIRouter(
     prefix="/api/v1/duty",
@@ -33,24 +40,23 @@ router = APIRouter(
 
 
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=NewDutyResponse)
-async def add_duty(request: NewDuty, current_user: Annotated[Staff, Security(get_current_active_user, scopes=["add-d"])]):
+async def add_duty(request: NewDuty, current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["add-d"])]):
     """Add a duty to the database"""
     try:
-        default_duty = await DefaultDocs.find_one(DefaultDocs.id == "total-participants")
-        default_learner = await DefaultDocs.find_one(DefaultDocs.id == "total_learners")
-        
-        if (default_duty.total + request.participants) > default_learner.total:
+        #* Reserve the participants before inserting so concurrent requests cannot exceed the total learners
+        if not await reserve_participants(request.participants):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Total participants exceeds the number of learners, please reduce the number of participants"
             )
         
         duty = Duties(**request.model_dump())
-        await duty.save()
         
-        #* Update the total number of participants
-        default_duty.total += duty.participants
-        await default_duty.save()
+        try:
+            await duty.insert()
+        except DuplicateKeyError:
+            await increment_total(TOTAL_PARTICIPANTS, -request.participants)
+            raise
         
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
@@ -66,8 +72,8 @@ async def add_duty(request: NewDuty, current_user: Annotated[Staff, Security(get
     
 
 @router.post("/assign", response_model=GenericResponse)
-async def assign_special_duties(request: SpecialDuties, current_user: Annotated[Staff, Security(get_current_active_user, scopes=["assign-s-d"])]):
-    learners = await Learners.find(Learners.present == True).to_list()
+async def assign_special_duties(request: SpecialDuties, current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["assign-s-d"])]):
+    learners = await Learners.find(Learners.present == True).project(LearnerSummary).to_list()
     duties: list[dict] = [duty.model_dump() for duty in request.duties]
     total_participants = 0
         
@@ -91,26 +97,32 @@ async def assign_special_duties(request: SpecialDuties, current_user: Annotated[
             }
         )
 
-    await assign_duties_to_learners(learners=learners, duties=duties)
+    try:
+        assigned = await assign_duties_to_learners(learners=learners, duties=duties)
+    except UnsatisfiableDutiesError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "status": "failed",
+                "message": str(e)
+            }
+        )
     
     return JSONResponse(
         status_code=status.HTTP_200_OK,
         content={
             "status": "success",
-            "message": "Duties assigned successfully"
+            "message": "Duties assigned successfully" if assigned else "Duties were already assigned today"
         }
     )
         
         
 @router.post("/mark")
-async def mark_assigned_duties(learners: Annotated[list[str], Body(description="The id of the learner", examples=[["677ab82e0fcee570714969b3"]])], current_user: Annotated[Staff, Security(get_current_active_user, scopes=["mark-d"])]):
+async def mark_assigned_duties(learners: Annotated[list[str], Body(description="The id of the learner", examples=[["677ab82e0fcee570714969b3"]])], current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["mark-d"])], clock: Annotated[Clock, Depends(get_clock)]):
     """
-    Marks the `completed` field for documents in `AssignedDuties` for
-    learner id in `learners`. It does this for documents with `day`,
-    `month` and `year` of the current date.
+    Marks the duties assigned today to the learners in `learners` as
+    completed, skipping learners outside the current user's blocks
     """
-    current_date = datetime.now()
-    
     if not learners:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -120,55 +132,38 @@ async def mark_assigned_duties(learners: Annotated[list[str], Body(description="
             }
         )
 
-    for learner_id in learners:
-        learner_in_db = await Learners.get(PydanticObjectId(learner_id))
-        
-        user_role = current_user.role
-        block = learner_in_db.block
-        
-        #* Checks if user provided an ID for a non existent learner or is trying to mark duties
-        #* for a learner not in their designated blocks, if so the learner ID will be skipped
-        if not learner_in_db or (user_role == "jr-matron" and (block == "C" or block == "D")) or (user_role == "sr-matron" and (block == "A" or block == "B")):
-            continue
-        
-        assigned_duty = await AssignedDuties.find_one(
-            And(
-                AssignedDuties.learner_details.id == learner_id,
-                AssignedDuties.day == current_date.day,
-                AssignedDuties.week_day == current_date.weekday(),
-                AssignedDuties.month == current_date.month,
-                AssignedDuties.year == current_date.year
-        ))
-        
-        if not assigned_duty:
-            continue
-        
-        assigned_duty.completed = True
-        await assigned_duty.save()
+    try:
+        outcomes = await mark_duties_completed(
+            learner_ids=learners,
+            policy=get_block_policy(current_user),
+            date_key=clock.date_key()
+        )
+    except InvalidId:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                "status": "failed",
+                "message": "Invalid learner IDs provided"
+            }
+        )
         
     return JSONResponse(
         status_code=status.HTTP_200_OK,
         content={
             "status": "success",
-            "message": "Assigned duties marked"
+            "message": "Assigned duties marked",
+            "detail": outcomes.model_dump()
         }
     )
        
        
 @router.get("/assign", response_model=GetAssignedDutiesResponse)
-async def get_assigned_duties(current_user: Annotated[Staff, Security(get_current_active_user, scopes=["get-a-d"])]):
-    """Retrieves all duties assigned to learners for the current date"""
-    current_date = datetime.now()
-    user_role = current_user.role
-    duties = []    
-    
+async def get_assigned_duties(current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["get-a-d"])], clock: Annotated[Clock, Depends(get_clock)]):
+    """Retrieves all duties assigned to learners in the current user's blocks for the current date"""
     assigned_duties = await AssignedDuties.find(
-        And(
-            AssignedDuties.day == current_date.day,
-            AssignedDuties.week_day == current_date.weekday(),
-            AssignedDuties.month == current_date.month,
-            AssignedDuties.year == current_date.year
-    )).to_list()
+        AssignedDuties.date == clock.date_key(),
+        get_block_policy(current_user).filter("learner.block")
+    ).to_list()
     
     if not assigned_duties:
         return JSONResponse(
@@ -179,15 +174,8 @@ async def get_assigned_duties(current_user: Annotated[Staff, Security(get_curren
             }
         )
         
-    for duty in assigned_duties:
-    
-        block = duty.learner_details.get("block")
-        
-        #* Filters returned records to ensure only receives records of their designated blocks
-        if (user_role == "jr-matron" and (block == "C" or block == "D")) or (user_role == "sr-matron" and (block == "A" or block == "B")):
-            continue
-        
-        duties.append(duty.model_dump())
+    await roster_cache.ensure_loaded()
+    duties = [roster_cache.expand(duty.model_dump(mode="json")) for duty in assigned_duties]
 
     return JSONResponse(
         status_code=status.HTTP_200_OK,
@@ -198,8 +186,85 @@ async def get_assigned_duties(current_user: Annotated[Staff, Security(get_curren
     )
 
 
+@router.get("/runs")
+async def get_duty_runs(
+    current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["run-d"])],
+    limit: Annotated[int, Query(description="Maximum number of runs returned, most recent first", ge=1, le=100)] = 20
+):
+    """Lists the most recent runs of the duty assignment job, scheduled and manual"""
+    job_runs = await JobRuns.find(JobRuns.job == DUTY_ASSIGNMENT_JOB).sort("-started_at").limit(limit).to_list()
+    
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "status": "success",
+            "runs": [job_run.model_dump(mode="json") for job_run in job_runs]
+        }
+    )
+
+
+@router.post("/runs")
+async def trigger_duty_run(
+    current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["run-d"])],
+    clock: Annotated[Clock, Depends(get_clock)],
+    dry_run: Annotated[bool, Query(description="Plan the assignment and return it without saving it")] = True
+):
+    """
+    Runs the duty assignment job now. A dry run returns the planned assignment
+    and the time spent fetching, assigning and persisting without writing it.
+
+    A real run takes the same lock as today's scheduled run, so the job runs
+    at most once a day however it is triggered
+    """
+    lock_name = f"{DUTY_ASSIGNMENT_JOB}:{clock.today().isoformat()}"
+    
+    if not dry_run and not await acquire_lock(lock_name, ttl=timedelta(days=1)):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "status": "failed",
+                "message": "The duty assignment job is running or already ran today"
+            }
+        )
+    
+    succeeded = False
+    
+    try:
+        job_run, result = await record_job_run(
+            DUTY_ASSIGNMENT_JOB,
+            run_key=f"manual:{clock.now().isoformat()}",
+            job=partial(assign_saturday_duties, dry_run=dry_run),
+            trigger="manual",
+            dry_run=dry_run
+        )
+        succeeded = job_run.status == "succeeded"
+    finally:
+        if not dry_run and not succeeded:
+            #* Nothing was assigned, let the scheduled run or another trigger try again
+            await release_lock(lock_name)
+    
+    if job_run.status == "failed":
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={
+                "status": "failed",
+                "message": f"The duty assignment job failed: {job_run.message}",
+                "run": job_run.model_dump(mode="json")
+            }
+        )
+    
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "status": "success",
+            "run": job_run.model_dump(mode="json"),
+            "plan": result.plan if result else []
+        }
+    )
+
+
 @router.get("")
-async def get_duties(current_user: Annotated[Staff, Security(get_current_active_user, scopes=["get-d"])], id: Annotated[str | None, Query(description="The name of the duty", min_length=6, max_length=50)] = None):
+async def get_duties(current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["get-d"])], id: Annotated[str | None, Query(description="The name of the duty", min_length=6, max_length=50)] = None):
     """Get all duties or a specific duty by `id`"""
     
     
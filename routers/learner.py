@@ -1,26 +1,30 @@
-from beanie import PydanticObjectId
+from fastapi import APIRouter, Security, status, HTTPException, UploadFile, Form, File, Path, Query, Header
+from fastapi.responses import JSONResponse
 
-from fastapi import APIRouter, Security, status, HTTPException, UploadFile, Form, File, Path
-from fastapi.responses import JSONResponse, StreamingResponse
-
-from typing import Annotated
+from typing import Annotated, Literal
 from pydantic import ValidationError, Field
 
-from io import BytesIO
+from zipfile import ZipFile, BadZipFile
 
 from dotenv import load_dotenv
 
 from security.helpers import get_current_active_user
+from security.schemas import StaffPrincipal
+from security.policy import get_block_policy
+
+from utils.helpers import get_learners_in_blocks, get_image_response
+
+from src.images import store_image, InvalidImageError, ImageSize, DEFAULT_IMAGE_SIZE
+from src.counters import increment_total, TOTAL_LEARNERS
+from src.learners import read_roster, import_learners
 
-from utils.helpers import get_learners_in_blocks, get_learner_or_staff, USER_NOT_FOUND_EXCEPTION
+from utils.roster_cache import roster_cache
 
 from pprint import pprint
 
-from schemas.learner import GetLearnerResponse, NewLearner, NewLearnerResponse
+from schemas.learner import GetLearnerResponse, NewLearner, NewLearnerResponse, LearnerImportReport
 
-from models.learner import Learners
-from models.staff import Staff
-from utils.models import DefaultDocs
+from models.learner import Learners, LearnerSummary, LearnerImageRef
 
 
 load_dotenv()
@@ -39,12 +43,10 @@ async def add_learner(
     block: Annotated[str, Form(description="The block the learner is in")],
     room: Annotated[int, Form(description="The room the learner is in")],
     grade: Annotated[int, Form(description="The grade the learner is in")],
-    current_user: Annotated[Staff, Security(get_current_active_user, scopes=["add-l"])]
+    current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["add-l"])]
 ):
     """Adds a new learner to the database"""
     try:
-        default_learner = await DefaultDocs.find_one(DefaultDocs.id == "total_learners")
-        
         request = NewLearner(
             first_name=first_name,
             last_name=last_name,
@@ -52,26 +54,18 @@ async def add_learner(
             grade=grade,
             room=room
         )
-        NOT_ALLOWED_TO_ADD_TO_BLOCK = HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail={
-                    "status": "failed",
-                    "message":f"Not allowed to add learners to block {block}"
-                }
-            )
+        policy = get_block_policy(current_user)
         
-        if current_user.role == "jr-matron" and (request.block == "C" or request.block == "D"):
-            raise NOT_ALLOWED_TO_ADD_TO_BLOCK 
-        elif current_user.role == "sr-matron" and (request.block == "A" or request.block == "B"):
-            raise NOT_ALLOWED_TO_ADD_TO_BLOCK
+        if not policy.allows(request.block):
+            raise policy.forbidden(f"Not allowed to add learners to block {request.block}")
 
-        new_learner = Learners(image=profile.file.read(), **request.model_dump())
+        image_key = await store_image(profile.file.read())
+        new_learner = Learners(image=image_key, **request.model_dump())
         
         await new_learner.save()
+        roster_cache.add([new_learner])
         
-        #* Increment the total number of learners
-        default_learner.total += 1
-        await default_learner.save()
+        await increment_total(TOTAL_LEARNERS, 1)
         
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
@@ -85,6 +79,14 @@ async def add_learner(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail='Service Unavailable'
         )
+    except InvalidImageError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "status": "failed",
+                "message": str(e)
+            }
+        )
     except ValidationError as e:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
@@ -93,35 +95,65 @@ async def add_learner(
                 "errors": e.errors()
             }
         )  
+
+
+@router.post('/import', response_model=LearnerImportReport)
+async def import_learners_in_bulk(
+    roster: Annotated[UploadFile, File(description="CSV or NDJSON roster with first_name, last_name, block, grade, room and image columns")],
+    images: Annotated[UploadFile, File(description="A zip archive of the images named in the roster's image column")],
+    current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["add-l"])],
+    format: Annotated[Literal["csv", "ndjson"] | None, Form(description="Format of the roster, inferred from its file name if not provided")] = None
+):
+    """
+    Adds every learner in `roster` to the database, reading each learner's
+    picture from `images` by the name in their `image` column. Rows that
+    cannot be imported are reported with their row number
+    """
+    if format is None:
+        format = "ndjson" if (roster.filename or "").lower().endswith((".ndjson", ".jsonl")) else "csv"
+    
+    try:
+        archive = ZipFile(images.file)
+    except BadZipFile:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "status": "failed",
+                "message": "Images must be a zip archive"
+            }
+        )
+    
+    try:
+        with archive:
+            report = await import_learners(read_roster(roster.file, format), archive, get_block_policy(current_user))
+    except ConnectionError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Service Unavailable'
+        )
+    
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content=report.model_dump()
+    )
        
         
 @router.get('/{id}/image')
-async def get_learner_image(id: Annotated[str, Path(description="The id of the learner")], current_user: Annotated[Staff, Security(get_current_active_user, scopes=["get-l-i"])]):
-    """Fetches the image of the learner with the provided `id` from the database"""
+async def get_learner_image(
+    id: Annotated[str, Path(description="The id of the learner")],
+    current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["get-l-i"])],
+    size: Annotated[ImageSize, Query(description="Size of the image, `thumbnail` and `medium` suit rosters")] = DEFAULT_IMAGE_SIZE,
+    if_none_match: Annotated[str | None, Header(description="ETag of the copy the client already has")] = None
+):
+    """
+    Fetches the image of the learner with the provided `id` from the database
+    in the requested `size`, or responds with 304 if the client's copy is current
+    """
     
     try:
-        learner_in_db = await Learners.find_one(Learners.id == PydanticObjectId(id))
+        learner_in_db = await get_block_policy(current_user).find_learner(id, LearnerImageRef)
         
-        if not learner_in_db:
-            raise USER_NOT_FOUND_EXCEPTION
-        
-        NOT_ALLOWED_TO_VIEW_IMAGE = HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail={
-                    "status": "failed",
-                    "message":f"Not allowed to view images of learners in block {learner_in_db}"
-                }
-            )
-        
-        if current_user.role == "jr-matron" and (learner_in_db.block == "C" or learner_in_db.block == "D"):
-            raise NOT_ALLOWED_TO_VIEW_IMAGE
-        elif current_user.role == "sr-matron" and (learner_in_db.block == "A" or learner_in_db.block == "B"):
-            raise NOT_ALLOWED_TO_VIEW_IMAGE
-        
-        image_bytes = learner_in_db.image  #* Get the binary image data
-        image_stream = BytesIO(image_bytes)
-        
-        return StreamingResponse(image_stream, media_type="image/jpeg")
+        return await get_image_response(learner_in_db.image, size, if_none_match)
     except ConnectionError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -130,41 +162,25 @@ async def get_learner_image(id: Annotated[str, Path(description="The id of the l
 
 
 @router.get('/{id}', response_model=GetLearnerResponse)
-async def get_learner(id: Annotated[str, Path(description="_id of the learner")], current_user: Annotated[Staff, Security(get_current_active_user, scopes=["get-l"])]):
+async def get_learner(id: Annotated[str, Path(description="_id of the learner")], current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["get-l"])]):
     """Fetches a learner from the database by the `id` provided in the path url"""
-    learner_in_db = await get_learner_or_staff(id)
-    
-    if not learner_in_db or not isinstance(learner_in_db, Learners):
-        raise USER_NOT_FOUND_EXCEPTION
-    
-    NOT_ALLOWED_TO_GET_LEARNER = HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail={
-                "status": "failed",
-                "message":f"Not allowed to get learners in block {learner_in_db.block}"
-            }
+    try:
+        learner_in_db = await get_block_policy(current_user).find_learner(id, LearnerSummary)
+    except ConnectionError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Oops, you cannot perform this action at the moment"
         )
     
-    if current_user.role == "jr-matron" and (learner_in_db.block == "C" or learner_in_db.block == "D"):
-        raise NOT_ALLOWED_TO_GET_LEARNER
-    elif current_user.role == "sr-matron" and (learner_in_db.block == "A" or learner_in_db.block == "B"):
-        raise NOT_ALLOWED_TO_GET_LEARNER
-    
-    return learner_in_db.model_dump(exclude=["image"])      
+    return learner_in_db.model_dump()      
 
 
 @router.get("")
-async def get_all_learners(current_user: Annotated[Staff, Security(get_current_active_user, scopes=["get-l"])]):
+async def get_all_learners(current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["get-l"])]):
     """Fetches all learners from the database who are in the blocks the current user is authoritative of"""
-    
-    if current_user.role == "jr-matron":
-        learners = await get_learners_in_blocks("A", "B")
-        return learners
-    elif current_user.role == "sr-matron":
-        learners = await get_learners_in_blocks("C", "D")
-        return learners
+    return await get_learners_in_blocks(*get_block_policy(current_user).blocks)
 
 
 @router.delete('/{id}')
-async def delete_learner(id: Annotated[str, Path(description="The ID of the learner to delete")], current_user: Annotated[Staff, Security(get_current_active_user, scopes=["get-l"])]):
+async def delete_learner(id: Annotated[str, Path(description="The ID of the learner to delete")], current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["get-l"])]):
     pass
\ No newline at end of file
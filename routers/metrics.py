@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Security, status
+from fastapi.responses import JSONResponse
+
+from typing import Annotated
+
+from security.helpers import get_current_active_user
+from security.schemas import StaffPrincipal
+
+from utils.cache import CACHES
+
+
+router = APIRouter(
+    prefix="/api/v1/metrics",
+    tags=["Metrics"]
+)
+
+
+@router.get("/caches")
+async def get_cache_metrics(current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["get-m"])]):
+    """Returns the size and hit/miss counters of every in-process cache"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "status": "success",
+            "caches": [cache.stats() for cache in CACHES.values()]
+        }
+    )
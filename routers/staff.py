@@ -1,23 +1,24 @@
 from pymongo.errors import DuplicateKeyError
 
-from fastapi import APIRouter, Security, status, HTTPException, UploadFile, File,Path, Form, Query
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import APIRouter, Security, status, HTTPException, UploadFile, File,Path, Form, Query, Header
+from fastapi.responses import JSONResponse
 
 from typing import Annotated
 from pydantic import ValidationError
 
-from io import BytesIO
-from PIL import Image
 
 from dotenv import load_dotenv
 
 
-from security.helpers import get_current_active_user, get_password_hash
+from security.helpers import get_current_active_user, get_password_hash, invalidate_staff_principal
+from security.schemas import StaffPrincipal
 
-from utils.helpers import get_learners_in_blocks, get_learner_or_staff, USER_NOT_FOUND_EXCEPTION
+from utils.helpers import get_learners_in_blocks, get_learner_or_staff, get_image_response, USER_NOT_FOUND_EXCEPTION
+
+from src.images import store_image, InvalidImageError, ImageSize, DEFAULT_IMAGE_SIZE
 
 from schemas.staff import NewStaff, NewStaffResponse
-from models.staff import Staff
+from models.staff import Staff, StaffImageRef
 
 from pprint import pprint
 
@@ -39,7 +40,7 @@ async def add_staff(
     role: Annotated[str, Form(description="The position of the new staff member")],
     password: Annotated[str, Form(description="The password to be used to log into the account")],
     verify_password: Annotated[str, Form(description="Should match `password`")],
-    current_user: Annotated[Staff, Security(get_current_active_user, scopes=["add-u"])]
+    current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["add-u"])]
 ):
     """Create new staff account 
     """
@@ -69,6 +70,8 @@ async def add_staff(
             permissions.append("get-u-i")
             permissions.append("get-u")
             permissions.append("delete-u")
+            permissions.append("get-m")
+            permissions.append("run-d")
         elif request.role == "jr-matron" or request.role == "sr-matron":
             permissions.append("get-l-i")
             permissions.append("get-l")
@@ -84,16 +87,17 @@ async def add_staff(
             permissions.append("delete-l")
         
         new_staff = Staff(
-            image=profile.file.read(),
+            image=await store_image(profile.file.read()),
             id=request.username,
             first_name=request.first_name,
             last_name=request.last_name,
             role=request.role,
-            password=get_password_hash(request.password),
+            password=await get_password_hash(request.password),
             permissions=permissions
         )
         
         await new_staff.save()
+        invalidate_staff_principal(new_staff.id)
         
         return JSONResponse(
             content={
@@ -115,6 +119,14 @@ async def add_staff(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already exists"
         )
+    except InvalidImageError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "status": "failed",
+                "message": str(e)
+            }
+        )
     except ConnectionError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -123,9 +135,21 @@ async def add_staff(
         
         
 @router.get('/{id}/image')
-async def get_staff_image(id: Annotated[str, Path(min_length=4, max_length=20, description='`id` of the user')], current_user: Annotated[Staff, Security(get_current_active_user, scopes=["get-u-i"])]):
+async def get_staff_image(
+    id: Annotated[str, Path(min_length=4, max_length=20, description='`id` of the user')],
+    current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["get-u-i"])],
+    size: Annotated[ImageSize, Query(description="Size of the image, `thumbnail` and `medium` suit rosters")] = DEFAULT_IMAGE_SIZE,
+    if_none_match: Annotated[str | None, Header(description="ETag of the copy the client already has")] = None
+):
+    """
+    Fetches the image of the staff member with the provided `id` in the
+    requested `size`, or responds with 304 if the client's copy is current
+    """
     try:
-        user_in_db = await Staff.find_one(Staff.id == id)
+        user_in_db = await Staff.find_one(Staff.id == id).project(StaffImageRef)
+
+        if not user_in_db:
+            raise USER_NOT_FOUND_EXCEPTION
         
         if current_user.role == "chief-matron" and user_in_db.role == "super-user":
             raise HTTPException(
@@ -135,20 +159,17 @@ async def get_staff_image(id: Annotated[str, Path(min_length=4, max_length=20, d
                     "message":"You do not have permission to view this image"
                 }
             )
-
-        if not user_in_db:
-            raise USER_NOT_FOUND_EXCEPTION
-        
-        image_bytes = user_in_db.image  #* Get the binary image data
-        image_stream = BytesIO(image_bytes)
         
-        return StreamingResponse(image_stream, media_type="image/jpeg")
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error processing image")
+        return await get_image_response(user_in_db.image, size, if_none_match)
+    except ConnectionError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Oops, you can't complete this action at the moment"
+        )
 
 
 @router.get('/{id}')
-async def get_staff(id: Annotated[str, Path(min_length=4, max_length=20, description='`id` of the user')], current_user: Annotated[Staff, Security(get_current_active_user, scopes=["get-u"])]):
+async def get_staff(id: Annotated[str, Path(min_length=4, max_length=20, description='`id` of the user')], current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["get-u"])]):
     staff_in_db = await get_learner_or_staff(id)
     
     user_role = current_user.role
@@ -173,7 +194,7 @@ async def get_staff(id: Annotated[str, Path(min_length=4, max_length=20, descrip
             
 
 @router.delete('/{id}')
-async def delete_staff(id: Annotated[str, Path(min_length=4, max_length=20, description='`id` of the user')], current_user: Annotated[Staff, Security(get_current_active_user, scopes=["delete-u"])]):
+async def delete_staff(id: Annotated[str, Path(min_length=4, max_length=20, description='`id` of the user')], current_user: Annotated[StaffPrincipal, Security(get_current_active_user, scopes=["delete-u"])]):
     staff_to_delete = await Staff.get(id)
     
     if not staff_to_delete:
@@ -188,7 +209,8 @@ async def delete_staff(id: Annotated[str, Path(min_length=4, max_length=20, desc
             }
         )
         
-    delete_response = await Staff.delete(Staff.id == id)
+    delete_response = await staff_to_delete.delete()
+    invalidate_staff_principal(id)
     
     if delete_response.deleted_count == 0:
         raise USER_NOT_FOUND_EXCEPTION
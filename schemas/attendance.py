@@ -8,4 +8,21 @@ from pydantic import Field, BaseModel
 class MarkAttendance(BaseModel):
     activity: Annotated[Literal["evening-study", "afternoon-study", "church", "supper", "breakfast"], Field(description="The activity attendance is being taken for")]
     present_learners: Annotated[list, Field(description="List of IDs for all learners present for the activity")]
-    absent_learners: Annotated[list, Field(description="List of IDs for all learners present for the activity")]
\ No newline at end of file
+    absent_learners: Annotated[list, Field(description="List of IDs for all learners present for the activity")]
+
+class AttendanceOutcomes(BaseModel):
+    """
+    Outcome of marking attendance for each learner ID provided
+
+    ## Attributes:
+    - created (list[str]): IDs of learners who had attendance recorded for the first time
+    - flipped (list[str]): IDs of learners whose attendance was changed from present to absent or vice versa
+    - skipped (list[str]): IDs of learners who were already marked the same way
+    - forbidden (list[str]): IDs of learners outside the blocks the user is in charge of
+    - not_found (list[str]): IDs that do not belong to any learner
+    """
+    created: list[str] = []
+    flipped: list[str] = []
+    skipped: list[str] = []
+    forbidden: list[str] = []
+    not_found: list[str] = []
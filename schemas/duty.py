@@ -4,6 +4,8 @@
 from typing import Annotated, Optional
 from pydantic import Field, BaseModel
 
+from utils.schemas import JobResult
+
 class NewDuty(BaseModel):
     id: Annotated[str, Field(description="The name of the duty",min_length=6, max_length=50)]
     description: Annotated[str, Field(description="Description of the duty",min_length=6, max_length=100)]
@@ -46,4 +48,30 @@ class DutyUpdate(BaseModel):
     
 class GetAssignedDutiesResponse(BaseModel):
     status: str = "success"
-    assigned_duties: list[dict]
\ No newline at end of file
+    assigned_duties: list[dict]
+
+class DutyRunResult(JobResult):
+    """
+    Outcome of a run of the duty assignment job, `timings` has the
+    `fetch`, `assign` and `persist` phases
+
+    ## Attributes:
+    - plan (list[dict]): The planned assignment, only for dry runs
+    """
+    plan: list[dict] = []
+
+
+class DutyMarkOutcomes(BaseModel):
+    """
+    Outcome of marking assigned duties as completed
+
+    ## Attributes:
+    - marked (int): Learners whose duty was marked as completed
+    - skipped (int): Learners without a duty today or whose duty was already completed
+    - forbidden (int): Learners outside the blocks the user is in charge of
+    - not_found (int): IDs that do not belong to any learner
+    """
+    marked: int = 0
+    skipped: int = 0
+    forbidden: int = 0
+    not_found: int = 0
@@ -48,4 +48,17 @@ class GetLearnerResponse(BaseModel):
 
 class NewLearnerResponse(BaseModel):
     learner_id: str
-    message: str = "Learner added successfully"
\ No newline at end of file
+    message: str = "Learner added successfully"
+
+
+class LearnerImportReport(BaseModel):
+    """
+    Outcome of a bulk learner import
+
+    ## Attributes:
+    - imported (int): Number of learners added
+    - failed (list[dict]): The `row` number and `errors` of each row that was not imported
+    """
+    status: str = "success"
+    imported: int = 0
+    failed: list[dict] = []
@@ -1,4 +1,5 @@
-import os, json
+import os, json, hashlib, asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from pprint import pprint
 
@@ -7,8 +8,8 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm, Se
 
 from jose import JWTError, jwt, jwe
 from jwt import InvalidTokenError
-from jose.exceptions import ExpiredSignatureError
-from . schemas import TokenData
+from jose.exceptions import ExpiredSignatureError, JWEError
+from . schemas import TokenData, StaffPrincipal
 
 
 from passlib.context import CryptContext
@@ -18,6 +19,8 @@ from typing import Annotated
 
 from models.staff import Staff
 
+from utils.cache import create_cache
+
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -25,6 +28,26 @@ load_dotenv()
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+#* bcrypt blocks for hundreds of milliseconds, so hashing runs in its own threads
+password_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", 4)),
+    thread_name_prefix="password-hash"
+)
+
+#* Staff principals cached by username so authenticated requests skip the database
+staff_principal_cache = create_cache(
+    "staff-principals",
+    max_size=int(os.getenv("STAFF_CACHE_MAX_SIZE", 1024)),
+    ttl=float(os.getenv("STAFF_CACHE_TTL_SECONDS", 60))
+)
+
+#* Decrypted token payloads cached by token digest until the token expires
+token_payload_cache = create_cache(
+    "token-payloads",
+    max_size=int(os.getenv("TOKEN_CACHE_MAX_SIZE", 4096)),
+    ttl=float(os.getenv("TOKEN_CACHE_TTL_SECONDS", 3600))
+)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", scopes={
     "me": "Read information about the current user.",
     "add-u": "Add user",
@@ -45,18 +68,22 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", scopes={
     "mark-d": "Marking duty completion",
     "mark-a": "Mark attendance for an activity",
     "get-a": "Get attendance",
-    "delete-l": "Delete a learner"
+    "delete-l": "Delete a learner",
+    "get-m": "Get metrics",
+    "run-d": "Run or dry run duty assignment"
 })
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    '''Verifies that `plain_password` and `hashed_password` are equal'''
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    '''Verifies that `plain_password` and `hashed_password` are equal, without blocking the event loop'''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, pwd_context.verify, plain_password, hashed_password)
 
 
-def get_password_hash(password: str) -> str:
-    '''Returns a hash of the `password`'''
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    '''Returns a hash of the `password`, without blocking the event loop'''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, pwd_context.hash, password)
 
 async def get_user(username: str) -> Staff | None:
     
@@ -65,12 +92,30 @@ async def get_user(username: str) -> Staff | None:
     return user_in_db
 
 
+async def get_staff_principal(username: str) -> StaffPrincipal | None:
+    '''Returns the `StaffPrincipal` of `username`, from the cache when possible'''
+    principal = staff_principal_cache.get(username)
+    
+    if principal is None:
+        principal = await Staff.find_one(Staff.id == username).project(StaffPrincipal)
+        
+        if principal is not None:
+            staff_principal_cache.set(username, principal)
+    
+    return principal
+
+
+def invalidate_staff_principal(username: str):
+    '''Removes the cached `StaffPrincipal` of `username`, call whenever the staff member changes'''
+    staff_principal_cache.invalidate(username)
+
+
 async def authenticate_user(username: str, password: str):
     user = await get_user(username)
     
     if not user:
         return False
-    if not verify_password(password, user.password):
+    if not await verify_password(password, user.password):
         return False
     return user
 
@@ -96,6 +141,33 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return encoded_jwe
 
 
+def decode_access_token(token: str) -> dict:
+    '''
+    Decrypts the JWE `token` and returns its payload. Payloads are cached until
+    the token expires, so repeat requests with the same token skip decryption
+    '''
+    token_digest = hashlib.sha256(token.encode('utf-8')).digest()
+    payload = token_payload_cache.get(token_digest)
+    
+    if payload is not None:
+        return payload
+    
+    #* Decrypt the JWE token
+    token_bytes = token.encode('utf-8')
+    payload_bytes = jwe.decrypt(token_bytes, os.getenv("SECRET_KEY"))
+    payload: dict = json.loads(payload_bytes)
+    
+    exp = payload.get("exp")
+    
+    if isinstance(exp, (int, float)):
+        time_left = exp - datetime.now(timezone.utc).timestamp()
+        
+        if time_left > 0:
+            token_payload_cache.set(token_digest, payload, ttl=time_left)
+    
+    return payload
+
+
 async def get_current_user(security_scopes: SecurityScopes, token: Annotated[str, Depends(oauth2_scheme)]):
     
     if security_scopes.scopes:
@@ -109,10 +181,7 @@ async def get_current_user(security_scopes: SecurityScopes, token: Annotated[str
         headers={"WWW-Authenticate": authenticate_value},
     )
     try:
-        #* Decrypt the JWE token
-        token_bytes = token.encode('utf-8')
-        payload_bytes = jwe.decrypt(token_bytes, os.getenv("SECRET_KEY"))
-        payload: dict = json.loads(payload_bytes)
+        payload = decode_access_token(token)
         
         username = payload.get("sub")
         exp = payload.get("exp")
@@ -127,7 +196,7 @@ async def get_current_user(security_scopes: SecurityScopes, token: Annotated[str
             raise ExpiredSignatureError
         
         token_data = TokenData(scopes=token_scopes, username=username)
-    except (InvalidTokenError, ValidationError):
+    except (InvalidTokenError, JWEError, ValueError, ValidationError):
         raise credentials_exception
     except ExpiredSignatureError:
         raise HTTPException(
@@ -135,7 +204,7 @@ async def get_current_user(security_scopes: SecurityScopes, token: Annotated[str
             detail="Your token has expired"
         )
     
-    user = await get_user(username=token_data.username)
+    user = await get_staff_principal(username=token_data.username)
     
     if user is None:
         raise credentials_exception
@@ -150,7 +219,7 @@ async def get_current_user(security_scopes: SecurityScopes, token: Annotated[str
     return user
 
 
-async def get_current_active_user(current_user: Annotated[Staff, Security(get_current_user, scopes=["me"])]):
+async def get_current_active_user(current_user: Annotated[StaffPrincipal, Security(get_current_user, scopes=["me"])]):
     if not current_user.active:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User is inactive")
     return current_user
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""Which learners a staff member may act on, as filters queries can include"""
+
+from functools import lru_cache
+
+from bson.errors import InvalidId
+from beanie import PydanticObjectId
+from pydantic import BaseModel
+
+from fastapi import HTTPException, status
+
+from models.learner import Learners
+
+from utils.helpers import USER_NOT_FOUND_EXCEPTION
+
+from .schemas import StaffPrincipal
+
+
+BLOCKS = ("A", "B", "C", "D")
+
+#* Blocks each matron role is in charge of, every other role manages all blocks
+BLOCKS_FOR_ROLE = {
+    "jr-matron": ("A", "B"),
+    "sr-matron": ("C", "D"),
+}
+
+
+class BlockPolicy:
+    '''
+    The blocks a staff member may manage, turned into filter fragments so
+    queries never fetch learners, attendance or duties outside them
+    '''
+
+    def __init__(self, blocks: tuple[str, ...]):
+        self.blocks = blocks
+
+    def allows(self, block: str) -> bool:
+        return block in self.blocks
+
+    def filter(self, field: str = "block") -> dict:
+        '''Returns a query fragment matching documents whose `field` is an allowed block'''
+        return {field: {"$in": list(self.blocks)}}
+
+    def forbidden(self, message: str) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={
+                "status": "failed",
+                "message": message
+            }
+        )
+
+    async def find_learner(self, learner_id: str, projection: type[BaseModel] | None = None):
+        '''
+        Retrieves the learner with `learner_id` if they are in an allowed block,
+        projected to `projection` if given.
+
+        Raises 404 if there is no such learner and 403 if they are in another
+        block, which is checked without fetching the learner
+        '''
+        try:
+            object_id = PydanticObjectId(learner_id)
+        except InvalidId:
+            raise USER_NOT_FOUND_EXCEPTION
+
+        query = Learners.find_one({"_id": object_id, **self.filter()})
+        learner = await (query.project(projection) if projection else query)
+
+        if learner:
+            return learner
+
+        if await Learners.find({"_id": object_id}).count():
+            raise self.forbidden("Not allowed to access learners outside your blocks")
+
+        raise USER_NOT_FOUND_EXCEPTION
+
+
+@lru_cache
+def get_policy_for_role(role: str) -> BlockPolicy:
+    return BlockPolicy(BLOCKS_FOR_ROLE.get(role, BLOCKS))
+
+
+def get_block_policy(user: StaffPrincipal) -> BlockPolicy:
+    '''Returns the policy for the blocks `user` is in charge of'''
+    return get_policy_for_role(user.role)
@@ -1,6 +1,7 @@
 """Contains request and response security schemas"""
 
-from pydantic import BaseModel
+from typing import Annotated, Literal
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class Token(BaseModel):
@@ -10,4 +11,17 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: str | None = None
-    scopes: list[str] = []
\ No newline at end of file
+    scopes: list[str] = []
+
+
+class StaffPrincipal(BaseModel):
+    """
+    Projection of `Staff` with only the fields needed to authorize requests,
+    cached per username by `get_current_user`
+    """
+    model_config = ConfigDict(populate_by_name=True)
+    
+    id: Annotated[str, Field(alias="_id", description="The username of the staff member")]
+    role: Literal["jr-matron", "sr-matron", "super-user", "chief-matron"]
+    active: bool = True
+    permissions: list[str] = []
@@ -0,0 +1,164 @@
+"""### Contains `Attendance` CRUD operations
+"""
+
+from datetime import datetime
+
+from beanie import PydanticObjectId
+from beanie.operators import In
+
+from pymongo import UpdateOne, UpdateMany
+
+from models.learner import Learners
+from models.attendance import Attendance
+
+from schemas.attendance import AttendanceOutcomes
+
+from security.policy import BlockPolicy
+
+from src.learners import find_learners_in_policy
+
+
+async def mark_attendance_in_bulk(
+    activity: str,
+    present_learners: list[str],
+    absent_learners: list[str],
+    policy: BlockPolicy,
+    date_key: datetime
+) -> AttendanceOutcomes:
+    '''
+    Marks attendance for `activity` for all learners in `present_learners` and
+    `absent_learners` using one query for the learners in blocks `policy`
+    allows, one query for attendance already taken on `date_key` and a single
+    unordered bulk write.
+
+    New rows are upserted on the learner, activity and date they are unique on,
+    learners marked by someone else in between are reported as skipped and
+    keep the attendance they were given.
+
+    Raises `InvalidId` if any of the provided learner IDs is not a valid ObjectId
+    '''
+    outcomes = AttendanceOutcomes()
+
+    #* Map each learner ID to whether they are present, an ID in both lists ends up absent
+    marked: dict[str, bool] = {}
+
+    for learner_id in present_learners:
+        marked[str(PydanticObjectId(learner_id))] = True
+    for learner_id in absent_learners:
+        marked[str(PydanticObjectId(learner_id))] = False
+
+    if not marked:
+        return outcomes
+
+    allowed_learners, forbidden, not_found = await find_learners_in_policy(list(marked), policy)
+    outcomes.forbidden.extend(forbidden)
+    outcomes.not_found.extend(not_found)
+
+    if not allowed_learners:
+        return outcomes
+
+    #* Not filtered by block, a learner who moved block keeps the row recorded under the old one
+    already_marked = await Attendance.find(
+        In(Attendance.learner.id, [learner.id for learner in allowed_learners.values()]),
+        Attendance.activity == activity,
+        Attendance.date == date_key
+    ).to_list()
+    already_marked = {str(attendance.learner.id): attendance for attendance in already_marked}
+
+    operations = []
+    creating: list[str] = []
+    mark_present: list[PydanticObjectId] = []
+    mark_absent: list[PydanticObjectId] = []
+
+    for learner_id, learner in allowed_learners.items():
+        present = marked[learner_id]
+        attendance = already_marked.get(learner_id)
+
+        if attendance and attendance.present == present:
+            outcomes.skipped.append(learner_id)
+        elif attendance:
+            #* Learner was marked the opposite way earlier, flip their attendance
+            (mark_present if present else mark_absent).append(attendance.id)
+            outcomes.flipped.append(learner_id)
+        else:
+            operations.append(UpdateOne(
+                {"learner.id": learner.id, "activity": activity, "date": date_key},
+                {"$setOnInsert": {"learner.block": learner.block, "present": present}},
+                upsert=True
+            ))
+            creating.append(learner_id)
+
+    if mark_present:
+        operations.append(UpdateMany({"_id": {"$in": mark_present}}, {"$set": {"present": True}}))
+    if mark_absent:
+        operations.append(UpdateMany({"_id": {"$in": mark_absent}}, {"$set": {"present": False}}))
+
+    if not operations:
+        return outcomes
+
+    result = await Attendance.get_motor_collection().bulk_write(operations, ordered=False)
+
+    #* Upserts are the first operations, one per learner in `creating`
+    for index, learner_id in enumerate(creating):
+        (outcomes.created if index in result.upserted_ids else outcomes.skipped).append(learner_id)
+
+    return outcomes
+
+
+#* Field each attendance report is grouped by, with the fields copied from the first row of each group
+REPORT_GROUPS = {
+    "learner": ("$learner.id", {
+        "block": {"$first": "$learner.block"},
+    }),
+    "block": ("$learner.block", {}),
+    "activity": ("$activity", {}),
+}
+
+
+async def get_attendance_report(group_by: str, match: dict) -> list[dict]:
+    '''
+    Counts attendance matching `match` as present and absent per learner,
+    block or activity in a single aggregation, returning one row per group.
+
+    Learner names are looked up once per learner after grouping
+    '''
+    group_key, group_fields = REPORT_GROUPS[group_by]
+    name_fields = {}
+    lookup = []
+
+    if group_by == "learner":
+        lookup = [{"$lookup": {
+            "from": Learners.get_motor_collection().name,
+            "localField": "_id",
+            "foreignField": "_id",
+            "as": "details"
+        }}]
+        name_fields = {
+            "first_name": {"$first": "$details.first_name"},
+            "last_name": {"$first": "$details.last_name"},
+        }
+
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": group_key,
+            "present": {"$sum": {"$cond": ["$present", 1, 0]}},
+            "total": {"$sum": 1},
+            **group_fields
+        }},
+        *lookup,
+        {"$project": {
+            "_id": 0,
+            group_by: {"$toString": "$_id"},
+            **name_fields,
+            **{field: 1 for field in group_fields},
+            "present": 1,
+            "absent": {"$subtract": ["$total", "$present"]},
+            "total": 1,
+            "present_percentage": {"$round": [{"$multiply": [{"$divide": ["$present", "$total"]}, 100]}, 2]},
+            "absent_percentage": {"$round": [{"$multiply": [{"$divide": [{"$subtract": ["$total", "$present"]}, "$total"]}, 100]}, 2]},
+        }},
+        {"$sort": {group_by: 1}},
+    ]
+
+    return await Attendance.aggregate(pipeline).to_list()
@@ -0,0 +1,75 @@
+"""### Contains `DefaultDocs` counter operations
+
+Counters are only ever changed with atomic `$inc` updates so concurrent
+requests cannot overwrite each other's changes.
+"""
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from models.duty import Duties
+from models.learner import Learners
+from utils.models import DefaultDocs
+from utils.schemas import JobResult
+
+
+TOTAL_LEARNERS = "total_learners"
+TOTAL_PARTICIPANTS = "total-participants"
+
+
+async def get_total(counter_id: str) -> int:
+    '''Returns the value of the counter `counter_id`, 0 if it does not exist'''
+    counter = await DefaultDocs.get_motor_collection().find_one({"_id": counter_id}, {"total": 1})
+
+    return counter["total"] if counter else 0
+
+
+async def increment_total(counter_id: str, amount: int):
+    '''Atomically adds `amount` to the counter `counter_id`, creating it if missing'''
+    await DefaultDocs.get_motor_collection().update_one(
+        {"_id": counter_id},
+        {"$inc": {"total": amount}},
+        upsert=True
+    )
+
+
+async def reserve_participants(participants: int) -> bool:
+    '''
+    Atomically adds `participants` to the total participants only if the new
+    total does not exceed the total learners, returning whether it was added
+    '''
+    total_learners = await get_total(TOTAL_LEARNERS)
+
+    if participants > total_learners:
+        return False
+
+    try:
+        #* A missing counter is upserted, an existing one that is too high fails the filter and the upsert collides with it
+        counter = await DefaultDocs.get_motor_collection().find_one_and_update(
+            {"_id": TOTAL_PARTICIPANTS, "total": {"$lte": total_learners - participants}},
+            {"$inc": {"total": participants}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return False
+
+    return counter is not None
+
+
+async def reconcile_totals() -> JobResult:
+    '''
+    Recomputes the total learners and total participants counters from the
+    `Learners` and `Duties` collections, correcting any drift
+    '''
+    total_learners = await Learners.count()
+    participants = await Duties.aggregate([
+        {"$group": {"_id": None, "total": {"$sum": "$participants"}}}
+    ]).to_list()
+    total_participants = participants[0]["total"] if participants else 0
+
+    collection = DefaultDocs.get_motor_collection()
+    await collection.update_one({"_id": TOTAL_LEARNERS}, {"$set": {"total": total_learners}}, upsert=True)
+    await collection.update_one({"_id": TOTAL_PARTICIPANTS}, {"$set": {"total": total_participants}}, upsert=True)
+
+    return JobResult(message=f"{total_learners} learners, {total_participants} participants")
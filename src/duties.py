@@ -0,0 +1,50 @@
+"""### Contains `AssignedDuties` CRUD operations
+"""
+
+from datetime import datetime
+
+from beanie import PydanticObjectId
+
+from models.duty import AssignedDuties
+
+from schemas.duty import DutyMarkOutcomes
+
+from security.policy import BlockPolicy
+
+from src.learners import find_learners_in_policy
+
+
+async def mark_duties_completed(learner_ids: list[str], policy: BlockPolicy, date_key: datetime) -> DutyMarkOutcomes:
+    '''
+    Marks the duties assigned to the learners in `learner_ids` on `date_key`
+    as completed using one query for the learners and a single `update_many`
+    restricted to the blocks `policy` allows.
+
+    Raises `InvalidId` if any of the provided learner IDs is not a valid ObjectId
+    '''
+    outcomes = DutyMarkOutcomes()
+    requested = list({str(PydanticObjectId(learner_id)) for learner_id in learner_ids})
+
+    learners, forbidden, not_found = await find_learners_in_policy(requested, policy)
+    outcomes.forbidden = len(forbidden)
+    outcomes.not_found = len(not_found)
+    allowed_ids = [learner.id for learner in learners.values()]
+
+    if not allowed_ids:
+        return outcomes
+
+    result = await AssignedDuties.get_motor_collection().update_many(
+        {
+            "learner.id": {"$in": allowed_ids},
+            **policy.filter("learner.block"),
+            "date": date_key,
+            "completed": {"$ne": True}
+        },
+        {"$set": {"completed": True}}
+    )
+
+    #* Learners without a duty today or whose duty was already completed are skipped
+    outcomes.marked = result.modified_count
+    outcomes.skipped = len(allowed_ids) - result.modified_count
+
+    return outcomes
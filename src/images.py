@@ -0,0 +1,209 @@
+"""### Contains `Images` CRUD operations
+
+Images are stored once in their own collection keyed by the SHA-256 digest of
+the uploaded bytes, learner and staff documents only keep the key.
+
+Uploads are decoded, resized to each of `IMAGE_SIZES` and re-encoded in a
+process pool started with the application, every size is stored as its own
+document.
+"""
+
+import os
+import asyncio
+import hashlib
+import multiprocessing
+
+from io import BytesIO
+from typing import Literal
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from pymongo.errors import BulkWriteError
+
+from models.image import Images
+
+
+#* Longest side in pixels of each size an image is stored in
+IMAGE_SIZES = {
+    "large": 1024,
+    "medium": 320,
+    "thumbnail": 96,
+}
+DEFAULT_IMAGE_SIZE = "large"
+
+ImageSize = Literal["large", "medium", "thumbnail"]
+
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "WEBP").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 80))
+IMAGE_CONTENT_TYPE = f"image/{IMAGE_FORMAT.lower()}"
+
+#* Stored images never change, clients revalidate with the ETag once this expires
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE_SECONDS", 7 * 24 * 60 * 60))
+
+#* Decoding and resizing is CPU bound, so it runs outside the event loop's process
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+#* Started by `start_image_workers`, importing this module never creates processes
+image_executor: ProcessPoolExecutor | None = None
+
+#* Images waiting for or being rendered, each holds its upload and renditions in memory
+IMAGE_RENDERS_IN_FLIGHT = int(os.getenv("IMAGE_RENDERS_IN_FLIGHT", 2 * IMAGE_WORKERS))
+render_slots = asyncio.Semaphore(IMAGE_RENDERS_IN_FLIGHT)
+
+
+def start_image_workers() -> ProcessPoolExecutor:
+    '''
+    Starts the process pool images are rendered in if it is not running and
+    returns it. Workers are spawned rather than forked, so they do not inherit
+    the threads of the process that starts them
+    '''
+    global image_executor
+
+    if image_executor is None:
+        image_executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+    return image_executor
+
+
+def stop_image_workers():
+    '''Shuts the process pool images are rendered in down'''
+    global image_executor
+
+    if image_executor is not None:
+        image_executor.shutdown(wait=False, cancel_futures=True)
+        image_executor = None
+
+
+class InvalidImageError(ValueError):
+    '''Raised when uploaded bytes cannot be decoded as an image'''
+
+
+def get_image_key(data: bytes) -> str:
+    '''Returns the key `data` is stored under in the image store'''
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_image_id(key: str, size: str) -> str:
+    '''Returns the ID of the document holding the `size` version of the image `key`'''
+    return f"{key}:{size}"
+
+
+def get_image_etag(key: str, size: str) -> str:
+    '''Returns the ETag of the `size` version of the image `key`, derived from its content hash'''
+    return f'"{get_image_id(key, size)}"'
+
+
+def render_image(data: bytes) -> dict[str, bytes]:
+    '''
+    Decodes `data` and re-encodes it as `IMAGE_FORMAT` in each of `IMAGE_SIZES`,
+    keeping the aspect ratio and applying the EXIF orientation.
+
+    Raises `InvalidImageError` if `data` is not an image
+    '''
+    try:
+        with Image.open(BytesIO(data)) as image:
+            #* Let JPEG decode at a reduced scale when it is much larger than needed
+            image.draft("RGB", (max(IMAGE_SIZES.values()),) * 2)
+            image = ImageOps.exif_transpose(image)
+            image = image.convert("RGBA" if IMAGE_FORMAT == "WEBP" and image.has_transparency_data else "RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise InvalidImageError(f"Not a valid image: {e}")
+
+    renditions = {}
+
+    for size, pixels in IMAGE_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((pixels, pixels), Image.Resampling.LANCZOS)
+
+        output = BytesIO()
+        resized.save(output, format=IMAGE_FORMAT, quality=IMAGE_QUALITY)
+        renditions[size] = output.getvalue()
+
+    return renditions
+
+
+async def render_documents(data: bytes) -> list[Images]:
+    '''
+    Renders `data` in the process pool, starting it if needed, and returns one
+    document per size. At most `IMAGE_RENDERS_IN_FLIGHT` images are submitted
+    to the pool at once
+    '''
+    key = get_image_key(data)
+
+    async with render_slots:
+        renditions = await asyncio.get_running_loop().run_in_executor(start_image_workers(), render_image, data)
+
+    return [
+        Images(id=get_image_id(key, size), data=rendition, content_type=IMAGE_CONTENT_TYPE)
+        for size, rendition in renditions.items()
+    ]
+
+
+async def insert_images(documents: list[Images]):
+    '''Inserts `documents`, ignoring sizes that are already stored'''
+    try:
+        await Images.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        #* Identical images already stored, anything else is a real failure
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+
+
+async def is_image_stored(key: str) -> bool:
+    '''Checks if every size of the image `key` is already in the image store'''
+    stored = await Images.get_motor_collection().count_documents(
+        {"_id": {"$in": [get_image_id(key, size) for size in IMAGE_SIZES]}}
+    )
+
+    return stored == len(IMAGE_SIZES)
+
+
+async def store_image(data: bytes) -> str:
+    '''
+    Saves every size of the image in `data` to the image store if it is not
+    already there and returns its key.
+
+    Raises `InvalidImageError` if `data` is not an image
+    '''
+    key = get_image_key(data)
+
+    if not await is_image_stored(key):
+        await insert_images(await render_documents(data))
+
+    return key
+
+
+async def store_images(images: list[bytes]) -> list[str | None]:
+    '''
+    Saves every size of each image in `images` to the image store with a
+    single unordered insert and returns their keys in the same order, None
+    for images that could not be decoded
+    '''
+    unique_images = {get_image_key(data): data for data in images}
+    rendered = await asyncio.gather(
+        *(render_documents(data) for data in unique_images.values()),
+        return_exceptions=True
+    )
+
+    documents = []
+    invalid_keys = set()
+
+    for key, result in zip(unique_images, rendered):
+        if isinstance(result, InvalidImageError):
+            invalid_keys.add(key)
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            documents.extend(result)
+
+    if documents:
+        await insert_images(documents)
+
+    keys = [get_image_key(data) for data in images]
+
+    return [None if key in invalid_keys else key for key in keys]
+
+
+async def get_image(key: str, size: ImageSize = DEFAULT_IMAGE_SIZE) -> Images | None:
+    '''Retrieves the `size` version of the image stored under `key`'''
+    return await Images.get(get_image_id(key, size))
@@ -0,0 +1,231 @@
+"""### Contains `Learners` CRUD operations
+"""
+
+import os
+import csv
+import json
+
+from typing import BinaryIO, Iterator, Iterable, Literal
+from zipfile import ZipFile, BadZipFile
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+
+from beanie import PydanticObjectId
+from beanie.operators import In
+
+from models.learner import Learners, LearnerSummary
+
+from schemas.learner import NewLearner, LearnerImportReport
+
+from security.policy import BlockPolicy
+
+from src.images import store_images
+from src.counters import increment_total, TOTAL_LEARNERS
+
+from utils.roster_cache import roster_cache
+
+
+#* Rows validated and inserted together, at most this many images are held in memory at once
+IMPORT_BATCH_SIZE = int(os.getenv("LEARNER_IMPORT_BATCH_SIZE", 200))
+MAX_IMPORT_IMAGE_BYTES = int(os.getenv("LEARNER_IMPORT_MAX_IMAGE_BYTES", 5 * 1024 * 1024))
+#* A batch also ends once its images pass this many bytes, so it holds at most one image more
+MAX_IMPORT_BATCH_BYTES = int(os.getenv("LEARNER_IMPORT_MAX_BATCH_BYTES", 64 * 1024 * 1024))
+
+
+async def find_learners_in_policy(learner_ids: list[str], policy: BlockPolicy) -> tuple[dict[str, LearnerSummary], list[str], list[str]]:
+    '''
+    Retrieves the learners in `learner_ids` that are in blocks `policy` allows
+    keyed by ID, and the IDs that are forbidden and not found.
+
+    Learners in other blocks are never fetched, only their IDs are looked up
+    when some requested learners were not returned
+    '''
+    object_ids = [PydanticObjectId(learner_id) for learner_id in learner_ids]
+    learners = await Learners.find(In(Learners.id, object_ids), policy.filter()).project(LearnerSummary).to_list()
+    allowed_learners = {str(learner.id): learner for learner in learners}
+
+    missing = [object_id for object_id in object_ids if str(object_id) not in allowed_learners]
+
+    if not missing:
+        return allowed_learners, [], []
+
+    existing = await Learners.get_motor_collection().distinct("_id", {"_id": {"$in": missing}})
+    existing = {str(object_id) for object_id in existing}
+    forbidden = [str(object_id) for object_id in missing if str(object_id) in existing]
+    not_found = [str(object_id) for object_id in missing if str(object_id) not in existing]
+
+    return allowed_learners, forbidden, not_found
+
+
+def decode_lines(file: BinaryIO) -> Iterator[str]:
+    '''Yields each line of `file` decoded as UTF-8, raising `UnicodeDecodeError` at the first line that is not'''
+    for number, line in enumerate(file):
+        yield line.decode("utf-8-sig" if number == 0 else "utf-8")
+
+
+def read_roster(file: BinaryIO, format: Literal["csv", "ndjson"]) -> Iterator[dict | str]:
+    '''
+    Yields each row of the roster in `file` as a dict, or an error message for
+    rows that cannot be parsed. The file is read one line at a time.
+
+    A CSV roster stops with `UnicodeDecodeError` or `csv.Error` at the first
+    line that cannot be read, an NDJSON roster skips such lines
+    '''
+    if format == "csv":
+        yield from csv.DictReader(decode_lines(file))
+        return
+
+    for number, line in enumerate(file):
+        try:
+            line = line.decode("utf-8-sig" if number == 0 else "utf-8")
+        except UnicodeDecodeError as e:
+            yield f"Invalid UTF-8: {e.reason}"
+            continue
+
+        if not line.strip():
+            continue
+
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield f"Invalid JSON: {e.msg}"
+            continue
+
+        yield row if isinstance(row, dict) else "Row must be a JSON object"
+
+
+def prepare_learner(row: dict | str, archive: ZipFile, policy: BlockPolicy) -> tuple[NewLearner, bytes] | list[str]:
+    '''
+    Validates `row` and reads its image from `archive`, returning the learner
+    and image, or the reasons the row cannot be imported
+    '''
+    if isinstance(row, str):
+        return [row]
+
+    row = dict(row)
+    image_name = row.pop("image", None)
+
+    if isinstance(row.get("block"), str):
+        row["block"] = row["block"].upper()
+
+    try:
+        learner = NewLearner.model_validate(row)
+    except ValidationError as e:
+        return [f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()]
+    except HTTPException as e:
+        return [e.detail]
+
+    if not policy.allows(learner.block):
+        return [f"Not allowed to add learners to block {learner.block}"]
+
+    if not image_name:
+        return ["image: Field required"]
+
+    try:
+        info = archive.getinfo(image_name)
+    except KeyError:
+        return [f"Image {image_name} not found in the archive"]
+
+    if info.file_size > MAX_IMPORT_IMAGE_BYTES:
+        return [f"Image {image_name} is larger than {MAX_IMPORT_IMAGE_BYTES} bytes"]
+
+    try:
+        data = archive.read(info)
+    except BadZipFile as e:
+        return [f"Image {image_name} could not be read: {e}"]
+
+    return learner, data
+
+
+def prepare_batch(
+    rows: Iterator[dict | str],
+    first_row: int,
+    archive: ZipFile,
+    policy: BlockPolicy,
+    report: LearnerImportReport
+) -> tuple[list[tuple[int, NewLearner]], list[bytes], int | None]:
+    '''
+    Reads and validates the next `IMPORT_BATCH_SIZE` rows of `rows`, numbered
+    from `first_row`, adding the rows that cannot be imported to `report`. The
+    batch ends early once its images pass `MAX_IMPORT_BATCH_BYTES`.
+
+    Returns the numbered learners and their images, and the number of the next
+    row or None once nothing more can be read
+    '''
+    learners: list[tuple[int, NewLearner]] = []
+    images: list[bytes] = []
+    row_number = first_row
+    batch_bytes = 0
+
+    try:
+        while row_number - first_row < IMPORT_BATCH_SIZE and batch_bytes < MAX_IMPORT_BATCH_BYTES:
+            row = next(rows, None)
+
+            if row is None:
+                return learners, images, None
+
+            prepared = prepare_learner(row, archive, policy)
+
+            if isinstance(prepared, list):
+                report.failed.append({"row": row_number, "errors": prepared})
+            else:
+                learners.append((row_number, prepared[0]))
+                images.append(prepared[1])
+                batch_bytes += len(prepared[1])
+
+            row_number += 1
+    except (UnicodeDecodeError, csv.Error) as e:
+        #* The rows before are still imported, nothing after can be read
+        report.failed.append({"row": row_number, "errors": [f"Roster could not be read from this row on: {e}"]})
+        return learners, images, None
+
+    return learners, images, row_number
+
+
+async def import_learners(rows: Iterable[dict | str], archive: ZipFile, policy: BlockPolicy) -> LearnerImportReport:
+    '''
+    Adds the learners in `rows` in batches of up to `IMPORT_BATCH_SIZE` rows
+    and `MAX_IMPORT_BATCH_BYTES` of images, storing each
+    batch's images and learners with one insert each, and increments the total
+    learners once for the whole import.
+
+    Rows are read and validated in a worker thread. Rows that fail validation
+    are skipped and reported with their row number, as are rows whose image
+    cannot be decoded. A roster that cannot be read to the end is reported at
+    the row it stopped at, the rows before it are still imported
+    '''
+    report = LearnerImportReport()
+    rows = iter(rows)
+    next_row = 1
+
+    try:
+        while next_row is not None:
+            learners, images, next_row = await run_in_threadpool(prepare_batch, rows, next_row, archive, policy, report)
+
+            if not learners:
+                continue
+
+            new_learners = []
+
+            for (row_number, learner), image_key in zip(learners, await store_images(images)):
+                if image_key is None:
+                    report.failed.append({"row": row_number, "errors": ["image: Not a valid image"]})
+                else:
+                    new_learners.append(Learners(image=image_key, **learner.model_dump()))
+
+            if not new_learners:
+                continue
+
+            await Learners.insert_many(new_learners)
+            report.imported += len(new_learners)
+    finally:
+        #* Count every inserted batch even if a later one failed
+        if report.imported:
+            await increment_total(TOTAL_LEARNERS, report.imported)
+            roster_cache.invalidate()
+
+    report.failed.sort(key=lambda failure: failure["row"])
+
+    return report
@@ -0,0 +1,34 @@
+"""Scratch MongoDB database for tests and benchmarks that need a server"""
+
+import os
+from contextlib import asynccontextmanager
+
+import pytest
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+from beanie import init_beanie
+
+
+@asynccontextmanager
+async def scratch_database(*document_models):
+    '''
+    Yields an empty database at `MONGODB_URL` with `document_models` initialised
+    and drops it afterwards. Skips the calling test when no server is reachable
+    '''
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"), serverSelectionTimeoutMS=1000)
+    database = client["hostelManagementBenchmark"]
+
+    try:
+        await client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        pytest.skip("MongoDB is not available")
+
+    try:
+        await client.drop_database(database.name)
+        await init_beanie(database=database, document_models=list(document_models))
+        yield database
+    finally:
+        await client.drop_database(database.name)
+        client.close()
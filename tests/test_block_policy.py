@@ -0,0 +1,70 @@
+import os
+import asyncio
+from time import perf_counter
+
+from models.learner import Learners, LearnerSummary
+from security.policy import BlockPolicy, BLOCKS, get_policy_for_role
+
+from tests.mongo import scratch_database
+
+
+def test_matrons_are_limited_to_their_blocks():
+    jr_matron = get_policy_for_role("jr-matron")
+    sr_matron = get_policy_for_role("sr-matron")
+
+    assert [block for block in BLOCKS if jr_matron.allows(block)] == ["A", "B"]
+    assert [block for block in BLOCKS if sr_matron.allows(block)] == ["C", "D"]
+
+
+def test_other_roles_manage_every_block():
+    for role in ("chief-matron", "super-user"):
+        assert all(get_policy_for_role(role).allows(block) for block in BLOCKS)
+
+
+def test_filter_matches_allowed_blocks_on_any_field():
+    policy = BlockPolicy(("A", "B"))
+
+    assert policy.filter() == {"block": {"$in": ["A", "B"]}}
+    assert policy.filter("learner.block") == {"learner.block": {"$in": ["A", "B"]}}
+
+
+def test_policies_are_shared_per_role():
+    assert get_policy_for_role("jr-matron") is get_policy_for_role("jr-matron")
+
+
+def test_forbidden_uses_the_failed_detail():
+    error = BlockPolicy(("A",)).forbidden("Not allowed")
+
+    assert error.status_code == 403
+    assert error.detail == {"status": "failed", "message": "Not allowed"}
+
+
+BENCHMARK_LEARNERS = int(os.getenv("BENCHMARK_LEARNERS", 20000))
+
+
+async def benchmark_policy_filter() -> dict[str, float]:
+    '''Times fetching one matron's learners with the policy filter and by filtering every learner after fetching'''
+    async with scratch_database(Learners):
+        await Learners.get_motor_collection().insert_many([
+            {"first_name": "John", "last_name": "Doe", "image": "key", "grade": 8 + index % 5, "room": 1 + index % 6, "block": BLOCKS[index % 4]}
+            for index in range(BENCHMARK_LEARNERS)
+        ])
+        policy = get_policy_for_role("jr-matron")
+
+        started = perf_counter()
+        filtered = await Learners.find(policy.filter()).project(LearnerSummary).to_list()
+        filtered_time = perf_counter() - started
+
+        started = perf_counter()
+        post_filtered = [learner for learner in await Learners.find_all().project(LearnerSummary).to_list() if policy.allows(learner.block)]
+        post_filtered_time = perf_counter() - started
+
+        assert {learner.id for learner in filtered} == {learner.id for learner in post_filtered}
+
+        return {"filter": filtered_time, "post-filter": post_filtered_time}
+
+
+def test_benchmark_policy_filter_against_post_filter():
+    timings = asyncio.run(benchmark_policy_filter())
+
+    print(f"\n{BENCHMARK_LEARNERS} learners, one matron's blocks: " + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in timings.items()))
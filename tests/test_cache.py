@@ -0,0 +1,62 @@
+import pytest
+
+from utils import cache
+from utils.cache import TTLCache
+
+
+@pytest.fixture
+def now(monkeypatch):
+    '''Controls the time seen by the cache, advance it by changing `now[0]`'''
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+
+    return now
+
+
+def test_entries_expire_after_ttl(now):
+    staff = TTLCache("staff", max_size=10, ttl=60)
+    staff.set("matron", "principal")
+
+    now[0] += 59
+    assert staff.get("matron") == "principal"
+
+    now[0] += 1
+    assert staff.get("matron") is None
+    assert staff.stats()["size"] == 0
+
+
+def test_entry_ttl_is_capped_at_cache_ttl(now):
+    tokens = TTLCache("tokens", max_size=10, ttl=60)
+    tokens.set("short", "payload", ttl=5)
+    tokens.set("long", "payload", ttl=3600)
+
+    now[0] += 5
+    assert tokens.get("short") is None
+
+    now[0] += 55
+    assert tokens.get("long") is None
+
+
+def test_least_recently_used_entry_is_evicted(now):
+    lru = TTLCache("lru", max_size=2, ttl=60)
+    lru.set("a", 1)
+    lru.set("b", 2)
+
+    assert lru.get("a") == 1
+
+    lru.set("c", 3)
+
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+
+
+def test_hits_and_misses_are_counted(now):
+    counted = TTLCache("counted", max_size=2, ttl=60)
+    counted.set("a", 1)
+    counted.get("a")
+    counted.get("b")
+    counted.invalidate("a")
+    counted.get("a")
+
+    assert counted.stats() == {"name": "counted", "size": 0, "max_size": 2, "hits": 1, "misses": 2, "hit_rate": 1 / 3}
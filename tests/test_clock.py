@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import pytz
+
+from utils.clock import Clock
+
+
+def test_date_key_rolls_over_at_local_midnight():
+    clock = Clock("Africa/Windhoek")
+    clock.freeze(datetime(2026, 10, 18, 23, 59))
+
+    assert clock.date_key() == datetime(2026, 10, 18)
+
+    clock.advance(timedelta(minutes=1))
+
+    assert clock.date_key() == datetime(2026, 10, 19)
+
+
+def test_date_key_follows_the_school_timezone_not_utc():
+    clock = Clock("Africa/Windhoek")
+    clock.freeze(pytz.utc.localize(datetime(2026, 10, 18, 22, 30)))
+
+    assert clock.local_now() == datetime(2026, 10, 19, 0, 30)
+    assert clock.date_key() == datetime(2026, 10, 19)
+
+
+def test_cached_date_key_rolls_over_across_daylight_saving():
+    clock = Clock("Europe/Berlin")
+    clock.freeze(datetime(2026, 3, 28, 23, 30))
+
+    assert clock.date_key() == datetime(2026, 3, 28)
+
+    #* Clocks go forward at 02:00 on the 29th, midnight is still an hour later
+    clock.advance(timedelta(minutes=30))
+
+    assert clock.date_key() == datetime(2026, 3, 29)
+    assert clock.local_now() == datetime(2026, 3, 29, 0, 0)
+
+    clock.advance(timedelta(hours=23))
+
+    assert clock.date_key() == datetime(2026, 3, 30)
+    assert clock.local_now() == datetime(2026, 3, 30, 0, 0)
+
+
+def test_advancing_by_days_moves_the_date_key():
+    clock = Clock("Africa/Windhoek")
+    clock.freeze(datetime(2026, 12, 31, 12, 0))
+    clock.advance(timedelta(days=1))
+
+    assert clock.today().isoformat() == "2027-01-01"
+    assert clock.date_key() == datetime(2027, 1, 1)
+
+
+def test_reset_follows_real_time():
+    clock = Clock("Africa/Windhoek")
+    clock.freeze(datetime(2000, 1, 1))
+    clock.reset()
+
+    assert clock.now().year >= 2026
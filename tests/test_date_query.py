@@ -0,0 +1,79 @@
+from datetime import date, datetime
+
+import pytest
+
+from beanie import PydanticObjectId
+from bson.errors import InvalidId
+
+from utils.helpers import get_date_query, get_page_cursor, get_page_query
+
+
+def test_no_parameters_matches_everything():
+    assert get_date_query() == {}
+
+
+def test_full_date_is_a_single_day_range():
+    assert get_date_query(day=18, month=10, year=2026) == {
+        "date": {"$gte": datetime(2026, 10, 18), "$lt": datetime(2026, 10, 19)}
+    }
+
+
+def test_year_and_month_is_a_month_range():
+    assert get_date_query(month=12, year=2026) == {
+        "date": {"$gte": datetime(2026, 12, 1), "$lt": datetime(2027, 1, 1)}
+    }
+
+
+def test_year_is_a_year_range():
+    assert get_date_query(year=2026) == {
+        "date": {"$gte": datetime(2026, 1, 1), "$lt": datetime(2027, 1, 1)}
+    }
+
+
+def test_parts_without_a_year_are_compared_per_document():
+    assert get_date_query(day=5, month=3) == {"$expr": {"$and": [
+        {"$eq": [{"$month": "$date"}, 3]},
+        {"$eq": [{"$dayOfMonth": "$date"}, 5]},
+    ]}}
+
+
+def test_weekday_counts_from_monday():
+    assert get_date_query(weekday=0, year=2026)["$expr"] == {"$and": [{"$eq": [{"$isoDayOfWeek": "$date"}, 1]}]}
+
+
+def test_start_and_end_are_inclusive():
+    assert get_date_query(start=date(2026, 10, 1), end=date(2026, 10, 18)) == {
+        "date": {"$gte": datetime(2026, 10, 1), "$lt": datetime(2026, 10, 19)}
+    }
+
+
+def test_range_is_narrowed_to_year_and_start_end():
+    assert get_date_query(year=2026, start=date(2025, 12, 1), end=date(2026, 2, 1)) == {
+        "date": {"$gte": datetime(2026, 1, 1), "$lt": datetime(2026, 2, 2)}
+    }
+
+
+def test_impossible_date_raises():
+    with pytest.raises(ValueError):
+        get_date_query(day=30, month=2, year=2026)
+
+
+def test_page_cursor_resumes_after_date_and_id():
+    last_id = PydanticObjectId("6712c0ffee0123456789abcd")
+    cursor = get_page_cursor(datetime(2026, 10, 18), last_id)
+
+    assert cursor == "2026-10-18.6712c0ffee0123456789abcd"
+    assert get_page_query(cursor) == {"$or": [
+        {"date": {"$gt": datetime(2026, 10, 18)}},
+        {"date": datetime(2026, 10, 18), "_id": {"$gt": last_id}},
+    ]}
+
+
+def test_malformed_page_cursor_raises():
+    with pytest.raises(ValueError):
+        get_page_query("yesterday.6712c0ffee0123456789abcd")
+
+
+def test_page_cursor_with_an_invalid_id_raises():
+    with pytest.raises(InvalidId):
+        get_page_query("2026-10-18.not-an-id")
@@ -0,0 +1,155 @@
+import random
+from datetime import datetime, timedelta
+from time import perf_counter
+
+import pytest
+
+from beanie import PydanticObjectId
+
+from models.duty import AssignedDuties
+from models.learner import LearnerSummary, LearnerRef
+from utils.duty_history import DutyHistory
+from utils.clock import clock
+from utils.duty_planner import plan_duty_assignment, UnsatisfiableDutiesError
+
+
+def make_learner(last_duty: str = "") -> LearnerSummary:
+    return LearnerSummary(id=PydanticObjectId(), first_name="John", last_name="Doe", grade=10, room=1, block="A", last_duty=last_duty)
+
+
+def has_assignment(learners: list[LearnerSummary], duties: list[dict]) -> bool:
+    '''Checks with a bipartite matching of slots to learners if a valid assignment exists'''
+    slots = [duty["id"] for duty in duties for _ in range(duty["participants"])]
+    matched: dict[int, int] = {}
+
+    def augment(slot: int, seen: set) -> bool:
+        for index, learner in enumerate(learners):
+            if learner.last_duty == slots[slot] or index in seen:
+                continue
+
+            seen.add(index)
+
+            if index not in matched or augment(matched[index], seen):
+                matched[index] = slot
+                return True
+
+        return False
+
+    return all(augment(slot, set()) for slot in range(len(slots)))
+
+
+def assert_valid(assignments: list[tuple[LearnerSummary, str]], learners: list[LearnerSummary], duties: list[dict]):
+    assigned_ids = [learner.id for learner, _ in assignments]
+
+    assert len(assigned_ids) == len(set(assigned_ids))
+    assert {learner.id for learner in learners} >= set(assigned_ids)
+
+    for learner, duty in assignments:
+        assert learner.last_duty != duty
+
+    for duty in duties:
+        assert sum(1 for _, assigned in assignments if assigned == duty["id"]) == duty["participants"]
+
+
+def test_plan_matches_brute_force_feasibility():
+    rng = random.Random(2026)
+    duty_ids = ["cleaning", "laundry", "kitchen", "garden"]
+
+    for _ in range(2000):
+        duties = [{"id": duty, "participants": rng.randint(0, 3)} for duty in rng.sample(duty_ids, rng.randint(1, 4))]
+        learners = [make_learner(rng.choice(duty_ids + [""])) for _ in range(rng.randint(0, 9))]
+
+        if has_assignment(learners, duties):
+            assert_valid(plan_duty_assignment(learners, duties), learners, duties)
+        else:
+            with pytest.raises(UnsatisfiableDutiesError):
+                plan_duty_assignment(learners, duties)
+
+
+def test_plan_rejects_more_slots_than_learners():
+    with pytest.raises(UnsatisfiableDutiesError):
+        plan_duty_assignment([make_learner()], [{"id": "cleaning", "participants": 2}])
+
+
+def test_plan_never_repeats_last_duty_when_forced():
+    learners = [make_learner("cleaning") for _ in range(3)] + [make_learner("laundry") for _ in range(3)]
+    duties = [{"id": "cleaning", "participants": 3}, {"id": "laundry", "participants": 3}]
+
+    assignments = plan_duty_assignment(learners, duties)
+
+    assert_valid(assignments, learners, duties)
+    assert all(learner.last_duty != duty for learner, duty in assignments)
+
+
+def make_assigned_duty(learner: LearnerSummary, duty: str, date: datetime) -> AssignedDuties:
+    '''Returns an unsaved assignment of `duty` to `learner` on `date`, without needing a database'''
+    return AssignedDuties.model_construct(learner=LearnerRef(id=learner.id, block=learner.block), assigned_duty=duty, date=date, completed=True)
+
+
+def make_history(done: list[tuple[LearnerSummary, int]]) -> DutyHistory:
+    '''Returns a history where each learner in `done` did "cleaning" the paired number of times in the past days'''
+    history = DutyHistory(window=timedelta(weeks=8), max_age=timedelta(hours=6))
+    today = clock.date_key()
+
+    history.record([
+        make_assigned_duty(learner, "cleaning", today - timedelta(days=day))
+        for learner, times in done for day in range(times, 0, -1)
+    ])
+
+    return history
+
+
+def test_plan_prefers_learners_without_recent_history():
+    learners = [make_learner() for _ in range(6)]
+    history = make_history([(learner, 2 if index < 4 else 0) for index, learner in enumerate(learners)])
+
+    for _ in range(20):
+        assignments = plan_duty_assignment(learners, [{"id": "cleaning", "participants": 2}], history)
+
+        assert {learner.id for learner, _ in assignments} == {learner.id for learner in learners[4:]}
+
+
+def test_plan_prefers_learners_who_did_the_duty_least_often():
+    learners = [make_learner() for _ in range(4)]
+    history = make_history(list(zip(learners, [3, 1, 2, 4])))
+
+    for _ in range(20):
+        assignments = plan_duty_assignment(learners, [{"id": "cleaning", "participants": 2}], history)
+
+        assert {learner.id for learner, _ in assignments} == {learners[1].id, learners[2].id}
+
+
+def test_plan_ignores_history_outside_the_window():
+    learners = [make_learner() for _ in range(2)]
+    history = make_history([])
+    history.record([
+        make_assigned_duty(learners[0], "cleaning", clock.date_key() - timedelta(weeks=9)),
+        make_assigned_duty(learners[1], "cleaning", clock.date_key() - timedelta(days=1)),
+    ])
+
+    for _ in range(20):
+        assignments = plan_duty_assignment(learners, [{"id": "cleaning", "participants": 1}], history)
+
+        assert [learner.id for learner, _ in assignments] == [learners[0].id]
+
+
+def test_plan_scales_to_a_large_roster():
+    '''Plans 10,000 learners over 200 duties, each with a history, and reports how long it took'''
+    rng = random.Random(2026)
+    duty_ids = [f"duty-{index}" for index in range(200)]
+    duties = [{"id": duty, "participants": 40} for duty in duty_ids]
+    learners = [make_learner(rng.choice(duty_ids)) for _ in range(10_000)]
+    history = DutyHistory(window=timedelta(weeks=8), max_age=timedelta(hours=6))
+    history.record([
+        make_assigned_duty(learner, rng.choice(duty_ids), clock.date_key() - timedelta(weeks=week))
+        for learner in learners for week in range(1, 8)
+    ])
+
+    started = perf_counter()
+    assignments = plan_duty_assignment(learners, duties, history)
+    elapsed = perf_counter() - started
+
+    print(f"\nPlanned {len(learners)} learners over {len(duties)} duties in {elapsed * 1000:.0f} ms")
+
+    assert_valid(assignments, learners, duties)
+    assert elapsed < 10
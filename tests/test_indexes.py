@@ -0,0 +1,113 @@
+import asyncio
+from datetime import date, timedelta
+
+from beanie import PydanticObjectId
+from pymongo import ASCENDING
+
+from models.attendance import Attendance
+from models.duty import AssignedDuties
+from security.policy import get_policy_for_role
+from utils.duty_history import DutyHistory
+from utils.helpers import get_date_key, get_date_query, get_page_query, get_page_cursor
+
+from tests.mongo import scratch_database
+
+
+TODAY = get_date_key(date(2026, 10, 17))
+POLICY = get_policy_for_role("jr-matron")
+
+
+def plan_stages(explanation) -> set[str]:
+    '''Returns every plan stage named anywhere in an explain result'''
+    if isinstance(explanation, dict):
+        stages = {explanation["stage"]} if isinstance(explanation.get("stage"), str) else set()
+        return stages.union(*(plan_stages(value) for value in explanation.values()))
+    if isinstance(explanation, list):
+        return set().union(*(plan_stages(value) for value in explanation))
+
+    return set()
+
+
+async def explain(query) -> set[str]:
+    '''Runs `query` with the collection and database of a seeded scratch database, returning the plan stages of its explain result'''
+    async with scratch_database(Attendance, AssignedDuties) as database:
+        await Attendance.get_motor_collection().insert_many([
+            {"activity": "supper", "learner": {"id": PydanticObjectId(), "block": "ABCD"[index % 4]}, "present": index % 3 > 0, "date": TODAY - timedelta(days=index % 30)}
+            for index in range(500)
+        ])
+        await AssignedDuties.get_motor_collection().insert_many([
+            {"learner": {"id": PydanticObjectId(), "block": "ABCD"[index % 4]}, "assigned_duty": "cleaning", "date": TODAY - timedelta(weeks=index % 10), "completed": False}
+            for index in range(500)
+        ])
+
+        return plan_stages(await query(database))
+
+
+def assert_uses_index(query):
+    stages = asyncio.run(explain(query))
+
+    assert "COLLSCAN" not in stages
+    assert "IXSCAN" in stages or "EXPRESS_IXSCAN" in stages
+
+
+def explain_attendance_find(query: dict):
+    '''Explains the attendance list query the way GET /attendance runs it'''
+    def run(database):
+        return database[Attendance.get_collection_name()].find(query).sort([("date", ASCENDING), ("_id", ASCENDING)]).limit(100).explain()
+
+    return run
+
+
+def test_attendance_for_today_uses_an_index():
+    assert_uses_index(explain_attendance_find({"date": TODAY, **POLICY.filter("learner.block")}))
+
+
+def test_attendance_for_a_range_uses_an_index():
+    query = get_date_query(start=TODAY.date() - timedelta(days=7), end=TODAY.date())
+    query.update({"activity": "supper", **POLICY.filter("learner.block")})
+
+    assert_uses_index(explain_attendance_find(query))
+
+
+def test_attendance_page_uses_an_index():
+    query = get_date_query(start=TODAY.date() - timedelta(days=7), end=TODAY.date())
+    query.update({**POLICY.filter("learner.block"), **get_page_query(get_page_cursor(TODAY - timedelta(days=3), PydanticObjectId()))})
+
+    assert_uses_index(explain_attendance_find(query))
+
+
+def test_attendance_report_match_uses_an_index():
+    match = get_date_query(start=TODAY.date() - timedelta(days=30), end=TODAY.date())
+    match.update(POLICY.filter("learner.block"))
+
+    assert_uses_index(lambda database: database.command(
+        "explain",
+        {"aggregate": Attendance.get_collection_name(), "pipeline": [{"$match": match}, {"$group": {"_id": "$learner.id", "total": {"$sum": 1}}}], "cursor": {}},
+        verbosity="queryPlanner"
+    ))
+
+
+def test_marking_duties_uses_an_index():
+    query = {"learner.id": {"$in": [PydanticObjectId() for _ in range(20)]}, **POLICY.filter("learner.block"), "date": TODAY, "completed": {"$ne": True}}
+
+    assert_uses_index(lambda database: database.command(
+        "explain",
+        {"update": AssignedDuties.get_collection_name(), "updates": [{"q": query, "u": {"$set": {"completed": True}}, "multi": True}]},
+        verbosity="queryPlanner"
+    ))
+
+
+def test_assigned_duties_for_today_use_an_index():
+    query = {"date": TODAY, **POLICY.filter("learner.block")}
+
+    assert_uses_index(lambda database: database[AssignedDuties.get_collection_name()].find(query).explain())
+
+
+def test_loading_duty_history_uses_an_index():
+    window_start = DutyHistory(window=timedelta(weeks=8), max_age=timedelta(hours=6)).window_start()
+
+    assert_uses_index(lambda database: database.command(
+        "explain",
+        {"aggregate": AssignedDuties.get_collection_name(), "pipeline": [{"$match": {"date": {"$gte": window_start}}}, {"$group": {"_id": "$learner.id", "dates": {"$push": "$date"}}}], "cursor": {}},
+        verbosity="queryPlanner"
+    ))
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import time
+from io import BytesIO
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import ZipFile
+
+from schemas.learner import LearnerImportReport
+from security.policy import get_policy_for_role
+from src import images, learners
+from src.learners import prepare_batch
+
+
+def make_archive(sizes: list[int]) -> ZipFile:
+    '''Returns an archive with an image `{index}.jpg` of each size in `sizes`'''
+    buffer = BytesIO()
+
+    with ZipFile(buffer, "w") as archive:
+        for index, size in enumerate(sizes):
+            archive.writestr(f"{index}.jpg", bytes([index % 256]) * size)
+
+    return ZipFile(buffer)
+
+
+def make_rows(count: int) -> list[dict]:
+    return [{"first_name": "John", "last_name": "Doe", "block": "C", "grade": "10", "room": "1", "image": f"{index}.jpg"} for index in range(count)]
+
+
+def test_batches_end_at_the_batch_size(monkeypatch):
+    monkeypatch.setattr(learners, "IMPORT_BATCH_SIZE", 3)
+    rows = iter(make_rows(5))
+    archive = make_archive([10] * 5)
+    policy = get_policy_for_role("chief-matron")
+    report = LearnerImportReport()
+
+    first, _, next_row = prepare_batch(rows, 1, archive, policy, report)
+    second, _, last_row = prepare_batch(rows, next_row, archive, policy, report)
+
+    assert [row for row, _ in first] == [1, 2, 3]
+    assert [row for row, _ in second] == [4, 5]
+    assert last_row is None
+    assert report.failed == []
+
+
+def test_batches_end_once_their_images_pass_the_byte_cap(monkeypatch):
+    monkeypatch.setattr(learners, "MAX_IMPORT_BATCH_BYTES", 250)
+    rows = iter(make_rows(7))
+    archive = make_archive([100] * 7)
+    policy = get_policy_for_role("chief-matron")
+    report = LearnerImportReport()
+
+    batches = []
+    next_row = 1
+
+    while next_row is not None:
+        batch, batch_images, next_row = prepare_batch(rows, next_row, archive, policy, report)
+        batches.append(([row for row, _ in batch], sum(map(len, batch_images))))
+
+    assert batches == [([1, 2, 3], 300), ([4, 5, 6], 300), ([7], 100)]
+
+
+def test_renders_in_flight_are_limited(monkeypatch):
+    in_flight = [0, 0]
+    lock = threading.Lock()
+
+    def render_image(data: bytes) -> dict[str, bytes]:
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+
+        return {"large": data}
+
+    async def insert_images(documents):
+        pass
+
+    monkeypatch.setattr(images, "render_image", render_image)
+    monkeypatch.setattr(images, "insert_images", insert_images)
+    monkeypatch.setattr(images, "Images", SimpleNamespace)
+    monkeypatch.setattr(images, "render_slots", asyncio.Semaphore(2))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        monkeypatch.setattr(images, "start_image_workers", lambda: executor)
+        keys = asyncio.run(images.store_images([bytes([index]) for index in range(12)]))
+
+    assert len(keys) == 12
+    assert in_flight[1] == 2
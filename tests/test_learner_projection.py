@@ -0,0 +1,64 @@
+import os
+import base64
+import asyncio
+from time import perf_counter
+
+from bson.raw_bson import RawBSONDocument
+from bson.codec_options import CodecOptions
+from beanie.odm.utils.projection import get_projection
+
+from models.learner import Learners, LearnerSummary
+
+from tests.mongo import scratch_database
+
+
+BENCHMARK_ROSTER = int(os.getenv("BENCHMARK_ROSTER", 1000))
+BENCHMARK_IMAGE_BYTES = int(os.getenv("BENCHMARK_IMAGE_BYTES", 50_000))
+
+
+def test_summary_does_not_fetch_the_image():
+    assert get_projection(LearnerSummary) == {
+        "_id": 1, "first_name": 1, "last_name": 1, "grade": 1, "room": 1, "block": 1, "present": 1, "last_duty": 1
+    }
+
+
+async def measure_roster(model: type[Learners] | type[LearnerSummary]) -> tuple[int, float]:
+    '''Returns the BSON bytes the server sends for every learner fetched as `model` and how long fetching them took'''
+    collection = Learners.get_motor_collection().with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+    transferred = 0
+
+    async for learner in collection.find({}, get_projection(model)):
+        transferred += len(learner.raw)
+
+    started = perf_counter()
+    await Learners.find_all().project(model).to_list()
+
+    return transferred, perf_counter() - started
+
+
+async def benchmark_learner_projection() -> dict[str, dict[str, tuple[int, float]]]:
+    '''
+    Measures bytes transferred and latency of fetching a roster as full
+    `Learners` and as `LearnerSummary`, with image keys as stored now and with
+    images inline as they were before the image store
+    '''
+    results = {}
+
+    for layout, image in (("image key", "0" * 64), ("inline image", base64.b64encode(os.urandom(BENCHMARK_IMAGE_BYTES)).decode())):
+        async with scratch_database(Learners):
+            await Learners.get_motor_collection().insert_many([
+                {"first_name": "John", "last_name": "Doe", "image": image, "grade": 8 + index % 5, "room": 1 + index % 6, "block": "ABCD"[index % 4], "present": True, "last_duty": ""}
+                for index in range(BENCHMARK_ROSTER)
+            ])
+            results[layout] = {model.__name__: await measure_roster(model) for model in (Learners, LearnerSummary)}
+
+    return results
+
+
+def test_benchmark_summary_against_full_learners():
+    results = asyncio.run(benchmark_learner_projection())
+
+    for layout, measured in results.items():
+        print(f"\n{BENCHMARK_ROSTER} learners, {layout}: " + ", ".join(f"{model} {transferred / 1024:.0f} KiB in {seconds * 1000:.1f} ms" for model, (transferred, seconds) in measured.items()))
+
+        assert measured["LearnerSummary"][0] < measured["Learners"][0]
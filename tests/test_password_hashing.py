@@ -0,0 +1,67 @@
+import os
+import asyncio
+from types import SimpleNamespace
+from time import perf_counter
+
+from security import helpers
+from security.helpers import authenticate_user, pwd_context
+
+
+CONCURRENT_LOGINS = int(os.getenv("BENCHMARK_LOGINS", 8))
+PASSWORD = "correct horse battery staple"
+
+
+async def measure_loop_lag(authenticate) -> float:
+    '''
+    Returns the longest the event loop went without running another coroutine
+    while `CONCURRENT_LOGINS` logins ran through `authenticate`
+    '''
+    done = asyncio.Event()
+    lag = 0.0
+
+    async def other_endpoint():
+        nonlocal lag
+
+        while not done.is_set():
+            started = perf_counter()
+            await asyncio.sleep(0)
+            lag = max(lag, perf_counter() - started)
+
+    ticker = asyncio.create_task(other_endpoint())
+    await asyncio.sleep(0)
+
+    try:
+        assert all(await asyncio.gather(*(authenticate("matron", PASSWORD) for _ in range(CONCURRENT_LOGINS))))
+    finally:
+        done.set()
+        await ticker
+
+    return lag
+
+
+async def blocking_authenticate_user(username: str, password: str):
+    '''`authenticate_user` as it was, verifying the password on the event loop'''
+    user = await helpers.get_user(username)
+
+    return user if pwd_context.verify(password, user.password) else False
+
+
+def test_concurrent_logins_do_not_block_the_event_loop(monkeypatch):
+    staff = SimpleNamespace(id="matron", password=pwd_context.hash(PASSWORD))
+
+    async def get_user(username: str):
+        return staff
+
+    monkeypatch.setattr(helpers, "get_user", get_user)
+
+    started = perf_counter()
+    pwd_context.verify(PASSWORD, staff.password)
+    verify_time = perf_counter() - started
+
+    off_loop = asyncio.run(measure_loop_lag(authenticate_user))
+    on_loop = asyncio.run(measure_loop_lag(blocking_authenticate_user))
+
+    print(f"\n{CONCURRENT_LOGINS} concurrent logins, one bcrypt verify {verify_time * 1000:.0f} ms, longest event loop stall: password executor {off_loop * 1000:.1f} ms, on the event loop {on_loop * 1000:.0f} ms")
+
+    assert off_loop < verify_time / 2
+    assert on_loop >= verify_time / 2
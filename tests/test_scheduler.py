@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from fastapi import HTTPException
+
+from models.scheduler import SchedulerLocks, JobRuns
+from routers import duty
+from schemas.duty import DutyRunResult
+from security.schemas import StaffPrincipal
+from utils.clock import clock
+from utils.scheduler import run_scheduled_job, DUTY_ASSIGNMENT_JOB
+
+from tests.mongo import scratch_database
+
+
+CHIEF_MATRON = StaffPrincipal(id="chief", role="chief-matron", permissions=["run-d"])
+
+
+async def run_scheduled_then_manual(scheduled: DutyRunResult) -> list[str]:
+    '''Runs today's scheduled duty assignment with outcome `scheduled`, then a manual run, returning the run statuses'''
+    async def assign_saturday_duties(dry_run: bool = False) -> DutyRunResult:
+        return DutyRunResult(learners_assigned=10)
+
+    async def scheduled_job() -> DutyRunResult:
+        return scheduled
+
+    async with scratch_database(SchedulerLocks, JobRuns):
+        await run_scheduled_job(DUTY_ASSIGNMENT_JOB, scheduled_job)
+
+        try:
+            with pytest.MonkeyPatch.context() as monkeypatch:
+                monkeypatch.setattr(duty, "assign_saturday_duties", assign_saturday_duties)
+                await duty.trigger_duty_run(current_user=CHIEF_MATRON, clock=clock, dry_run=False)
+        finally:
+            runs = await JobRuns.find(JobRuns.job == DUTY_ASSIGNMENT_JOB).sort("started_at").to_list()
+
+        return [run.status for run in runs]
+
+
+def test_manual_run_goes_ahead_after_a_skipped_scheduled_run():
+    statuses = asyncio.run(run_scheduled_then_manual(DutyRunResult(status="skipped", message="9 learners are present but duties need 10 participants")))
+
+    assert statuses == ["skipped", "succeeded"]
+
+
+def test_manual_run_conflicts_with_a_successful_scheduled_run():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run_scheduled_then_manual(DutyRunResult(learners_assigned=10)))
+
+    assert error.value.status_code == 409
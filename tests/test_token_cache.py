@@ -0,0 +1,92 @@
+import os
+import asyncio
+from datetime import timedelta
+from time import perf_counter
+
+import pytest
+
+from fastapi.security import SecurityScopes
+
+from security import helpers
+from security.helpers import create_access_token, decode_access_token, get_current_user, token_payload_cache, staff_principal_cache
+from security.schemas import StaffPrincipal
+
+
+BENCHMARK_REQUESTS = int(os.getenv("BENCHMARK_REQUESTS", 2000))
+
+
+@pytest.fixture(autouse=True)
+def secret_key(monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "benchmark-secret-key-of-32-bytes")
+    token_payload_cache.clear()
+    staff_principal_cache.clear()
+    yield
+    token_payload_cache.clear()
+    staff_principal_cache.clear()
+
+
+def make_token(expires_delta: timedelta) -> str:
+    '''Returns a token for "matron" as clients send it back'''
+    return create_access_token({"sub": "matron", "scopes": ["me"]}, expires_delta).decode()
+
+
+def count_decryptions(monkeypatch) -> list[int]:
+    '''Counts calls to `jwe.decrypt` made through the security helpers'''
+    calls = [0]
+    decrypt = helpers.jwe.decrypt
+
+    def counted(*args, **kwargs):
+        calls[0] += 1
+        return decrypt(*args, **kwargs)
+
+    monkeypatch.setattr(helpers.jwe, "decrypt", counted)
+
+    return calls
+
+
+def test_repeat_tokens_skip_decryption(monkeypatch):
+    calls = count_decryptions(monkeypatch)
+    token = make_token(timedelta(minutes=5))
+
+    assert decode_access_token(token) == decode_access_token(token)
+    assert calls[0] == 1
+
+
+def test_expired_tokens_are_not_cached(monkeypatch):
+    calls = count_decryptions(monkeypatch)
+    token = make_token(timedelta(minutes=-1))
+
+    decode_access_token(token)
+    decode_access_token(token)
+
+    assert calls[0] == 2
+    assert token_payload_cache.stats()["size"] == 0
+
+
+async def benchmark_get_current_user() -> dict[str, float]:
+    '''Times authorizing the same token with the payload cache emptied before every request and kept warm'''
+    token = make_token(timedelta(minutes=5))
+    scopes = SecurityScopes(scopes=["me"])
+    staff_principal_cache.set("matron", StaffPrincipal(id="matron", role="jr-matron"))
+    timings = {}
+
+    started = perf_counter()
+    for _ in range(BENCHMARK_REQUESTS):
+        token_payload_cache.clear()
+        await get_current_user(scopes, token)
+    timings["cold"] = (perf_counter() - started) / BENCHMARK_REQUESTS
+
+    started = perf_counter()
+    for _ in range(BENCHMARK_REQUESTS):
+        await get_current_user(scopes, token)
+    timings["warm"] = (perf_counter() - started) / BENCHMARK_REQUESTS
+
+    return timings
+
+
+def test_benchmark_get_current_user_cold_and_warm():
+    timings = asyncio.run(benchmark_get_current_user())
+
+    print(f"\nget_current_user over {BENCHMARK_REQUESTS} requests: " + ", ".join(f"{name} cache {seconds * 1_000_000:.1f} µs" for name, seconds in timings.items()))
+
+    assert timings["warm"] < timings["cold"]
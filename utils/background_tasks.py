@@ -1,22 +1,87 @@
 from datetime import datetime
 
-from models.learner import Learners
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
 from models.attendance import Attendance
+from models.learner import LearnerRef
+
+from security.policy import BLOCKS
+
+from utils.helpers import get_date_key
+from utils.roster_cache import roster_cache
+from utils.schemas import JobResult
+from utils.clock import clock
+
+
+#* When roll call for each activity closes, as `CronTrigger` fields
+ACTIVITY_CUTOFFS = {
+    "breakfast": {"hour": 7, "minute": 30},
+    "afternoon-study": {"hour": 16, "minute": 30},
+    "supper": {"hour": 18, "minute": 30},
+    "evening-study": {"hour": 21, "minute": 0},
+    "church": {"day_of_week": "sun", "hour": 11, "minute": 0},
+}
+
+
+def get_absentee_job_name(activity: str) -> str:
+    '''Returns the name of the scheduled job filling in absentees for `activity`'''
+    return f"mark-absentees-{activity}"
+
+
+async def mark_absent_for_activity(activity: str, current_date: datetime, blocks: tuple[str, ...] = BLOCKS) -> int:
+    '''
+    Records every learner in `blocks` without attendance for `activity` on
+    `current_date` as absent, returning how many were recorded.
 
+    Absentees are the roster cache minus the learners already marked, found
+    with one query and inserted with one unordered `insert_many`. Learners
+    marked concurrently are rejected by the unique index and skipped.
 
-async def mark_absent_for_activity(present_learners: list[Learners], activity):
-    present_learners_ids = [learner.id for learner in present_learners]
-    absent_learners = await Learners.find({"_id": {"$nin": present_learners_ids}}).to_list()
-    current_date = datetime.now()
-    
-    for learner in absent_learners:
-        attendance = Attendance(
-            activity=activity,
-            day=current_date.day,
-            month=current_date.month,
-            week_day=current_date.weekday(),
-            year=current_date.year,
-            learner_details=learner.model_dump(exclude=["present", "image"])
+    Blocks where roll call was not taken at all are left alone, as the
+    activity did not happen there
+    '''
+    date_key = get_date_key(current_date)
+    marked: set[ObjectId] = set()
+    marked_blocks: set[str] = set()
+
+    async for attendance in Attendance.get_motor_collection().find(
+        {"activity": activity, "date": date_key},
+        {"learner": 1}
+    ):
+        marked.add(attendance["learner"]["id"])
+        marked_blocks.add(attendance["learner"]["block"])
+
+    blocks = tuple(block for block in blocks if block in marked_blocks)
+    absent_learners = [learner for learner in await roster_cache.get_learners(blocks) if learner.id not in marked]
+
+    if not absent_learners:
+        return 0
+
+    try:
+        result = await Attendance.insert_many(
+            [
+                Attendance(
+                    activity=activity,
+                    date=date_key,
+                    present=False,
+                    learner=LearnerRef(id=learner.id, block=learner.block)
+                )
+                for learner in absent_learners
+            ],
+            ordered=False
         )
-        
-        await attendance.save()
\ No newline at end of file
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+
+        return e.details["nInserted"]
+
+    return len(result.inserted_ids)
+
+
+async def fill_absentees(activity: str) -> JobResult:
+    '''Scheduled job marking everyone without attendance for `activity` today as absent'''
+    recorded = await mark_absent_for_activity(activity, clock.now())
+
+    return JobResult(message=f"{recorded} learners marked absent for {activity}")
@@ -0,0 +1,84 @@
+"""In-process caches shared by the application"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache:
+    '''
+    A least recently used cache whose entries expire `ttl` seconds after
+    they are set, or at the expiry given when setting them.
+
+    Hits and misses are counted so they can be reported by the API
+    '''
+
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any | None:
+        '''Returns the value cached under `key`, or None if missing or expired'''
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        '''Caches `value` under `key` for `ttl` seconds, defaulting to the cache's ttl'''
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+
+        #* Evict least recently used entries once the cache is full
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        '''Removes the entry cached under `key`'''
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        '''Returns the size and hit/miss counters of the cache'''
+        lookups = self.hits + self.misses
+
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+#* Every cache created with `create_cache` or registered here, reported by the metrics endpoint
+CACHES: dict[str, Any] = {}
+
+
+def create_cache(name: str, max_size: int, ttl: float) -> TTLCache:
+    '''Creates a `TTLCache` and registers it under `name`'''
+    cache = TTLCache(name, max_size, ttl)
+    CACHES[name] = cache
+
+    return cache
@@ -0,0 +1,76 @@
+"""Current time and date in the school's timezone"""
+
+import os
+from datetime import datetime, date, timedelta
+
+import pytz
+
+
+class Clock:
+    '''
+    Tells the current time in `timezone` and caches today's date key until
+    local midnight.
+
+    Tests can `freeze` the clock at a moment or `advance` it, the date key
+    rolls over as it would at midnight
+    '''
+
+    def __init__(self, timezone: str):
+        self.timezone = pytz.timezone(timezone)
+        self._frozen_at: datetime | None = None
+        self._offset = timedelta()
+        self._date_key: datetime | None = None
+        self._rolls_over_at: datetime | None = None
+
+    def now(self) -> datetime:
+        '''Returns the current time in the school's timezone'''
+        current = self._frozen_at or datetime.now(pytz.utc)
+
+        return (current + self._offset).astimezone(self.timezone)
+
+    def local_now(self) -> datetime:
+        '''Returns the current local time without tzinfo, comparable with stored date keys'''
+        return self.now().replace(tzinfo=None)
+
+    def today(self) -> date:
+        return self.now().date()
+
+    def date_key(self) -> datetime:
+        '''Returns today's local date at midnight, the value stored in `date` fields'''
+        now = self.now()
+
+        if self._date_key is None or now >= self._rolls_over_at:
+            self._date_key = datetime(now.year, now.month, now.day)
+            self._rolls_over_at = self.timezone.normalize(self.timezone.localize(self._date_key + timedelta(days=1)))
+
+        return self._date_key
+
+    def freeze(self, at: datetime | None = None):
+        '''Stops the clock at `at`, a naive `at` is taken as local time. Defaults to now'''
+        if at is None:
+            at = datetime.now(pytz.utc)
+        elif at.tzinfo is None:
+            at = self.timezone.localize(at)
+
+        self._frozen_at = at
+        self._offset = timedelta()
+        self._date_key = None
+
+    def advance(self, delta: timedelta):
+        '''Moves the clock forward by `delta`, or back if negative'''
+        self._offset += delta
+        self._date_key = None
+
+    def reset(self):
+        '''Makes the clock follow real time again'''
+        self._frozen_at = None
+        self._offset = timedelta()
+        self._date_key = None
+
+
+clock = Clock(os.getenv("SCHOOL_TIMEZONE", "Africa/Windhoek"))
+
+
+def get_clock() -> Clock:
+    '''Dependency providing the clock, override it to control time in tests'''
+    return clock
@@ -0,0 +1,82 @@
+"""In-memory index of the duties each learner was assigned recently"""
+
+import os
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from models.duty import AssignedDuties
+
+from utils.clock import clock
+
+
+class DutyHistory:
+    '''
+    Dates each learner was assigned each duty within a rolling window, built
+    from `AssignedDuties` with one aggregation and kept up to date by
+    recording every new assignment
+    '''
+
+    def __init__(self, window: timedelta, max_age: timedelta):
+        self.window = window
+        self.max_age = max_age
+        self.loaded_at: datetime | None = None
+        self._dates: dict[tuple[str, str], list[datetime]] = {}
+
+    def window_start(self) -> datetime:
+        '''Returns the earliest date assignments count towards the history'''
+        return clock.local_now() - self.window
+
+    async def load(self):
+        '''Rebuilds the history from the `AssignedDuties` within the window'''
+        pipeline = [
+            {"$match": {"date": {"$gte": self.window_start()}}},
+            {"$group": {
+                "_id": {"learner": "$learner.id", "duty": "$assigned_duty"},
+                "dates": {"$push": "$date"}
+            }},
+        ]
+        dates = {}
+
+        for row in await AssignedDuties.aggregate(pipeline).to_list():
+            dates[(str(row["_id"]["learner"]), row["_id"]["duty"])] = sorted(row["dates"])
+
+        self._dates = dates
+        self.loaded_at = datetime.now()
+
+    async def ensure_loaded(self):
+        '''Loads the history if it was never loaded or is older than `max_age`'''
+        if self.loaded_at is None or datetime.now() - self.loaded_at > self.max_age:
+            await self.load()
+
+    def record(self, assigned_duties: list[AssignedDuties]):
+        '''Adds newly persisted `assigned_duties` to the history'''
+        for assigned_duty in assigned_duties:
+            dates = self._dates.setdefault((str(assigned_duty.learner.id), assigned_duty.assigned_duty), [])
+
+            if not dates or dates[-1] <= assigned_duty.date:
+                dates.append(assigned_duty.date)
+            else:
+                dates.insert(bisect_left(dates, assigned_duty.date), assigned_duty.date)
+
+    def priority(self, learner_id: str, duty: str, since: datetime) -> tuple[int, datetime] | None:
+        '''
+        Returns how often and when last `learner_id` was assigned `duty` since
+        `since`, or None if they were not. Lower values should be picked first
+        '''
+        dates = self._dates.get((learner_id, duty))
+
+        if not dates:
+            return None
+
+        count = len(dates) - bisect_left(dates, since)
+
+        if not count:
+            return None
+
+        return count, dates[-1]
+
+
+duty_history = DutyHistory(
+    window=timedelta(weeks=int(os.getenv("DUTY_HISTORY_WEEKS", 8))),
+    max_age=timedelta(hours=int(os.getenv("DUTY_HISTORY_MAX_AGE_HOURS", 6)))
+)
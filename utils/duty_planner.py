@@ -0,0 +1,222 @@
+"""Plans which learner does which duty without repeating their last duty"""
+
+import heapq
+import secrets
+
+from models.learner import LearnerSummary
+
+from utils.duty_history import DutyHistory
+
+
+class UnsatisfiableDutiesError(ValueError):
+    '''Raised when duties cannot be assigned without repeating a learner's last duty'''
+
+
+class DutyPlanner:
+    '''
+    Pairs each participant slot of `duties` with a learner in `learners` who
+    was not assigned that duty last. Learners left over once every slot is
+    filled are not assigned a duty, which is tracked as the duty `None`.
+
+    Learners are grouped by `last_duty` and shuffled. A group or duty is tight
+    when it has as many learners and open slots combined as there are learners
+    left, the next step must then pair it with a compatible counterpart to keep
+    the assignment possible. Otherwise the duty with the most open slots takes
+    any learner who did not do it last.
+
+    With a `history`, the learner taken for a duty is one who has not done it
+    within the history window, otherwise the one who did it least often and
+    least recently. Learners are only left without a duty once that is forced,
+    so the learners left over are the ones no duty preferred.
+
+    Raises `UnsatisfiableDutiesError` when created if no valid assignment
+    exists. A planner plans once
+    '''
+
+    def __init__(self, learners: list[LearnerSummary], duties: list[dict], history: DutyHistory | None = None):
+        self.learners = learners
+        self.history = history
+        self.window_start = history.window_start() if history else None
+        self.learner_ids = [str(learner.id) for learner in learners]
+        self.remaining = len(learners)
+        self.assigned = [False] * len(learners)
+
+        self.slots: dict[str | None, int] = {}
+
+        for duty in duties:
+            if duty["participants"] > 0:
+                self.slots[duty["id"]] = self.slots.get(duty["id"], 0) + duty["participants"]
+
+        #* Open slots of actual duties, leaving learners without a duty is put off until it is forced
+        self.duty_slots = sum(self.slots.values())
+
+        if self.duty_slots > self.remaining:
+            raise UnsatisfiableDutiesError(f"{self.duty_slots} duty participants required but only {self.remaining} learners available")
+
+        if self.remaining > self.duty_slots:
+            self.slots[None] = self.remaining - self.duty_slots
+
+        #* Indexes into `learners` grouped by last duty, with the number not yet assigned per group
+        self.groups: dict[str, list[int]] = {}
+
+        for index, learner in enumerate(learners):
+            self.groups.setdefault(learner.last_duty, []).append(index)
+
+        self.everyone = list(range(len(learners)))
+
+        for members in [self.everyone, *self.groups.values()]:
+            secrets.SystemRandom().shuffle(members)
+
+        self.group_sizes = {key: len(members) for key, members in self.groups.items()}
+
+        #* Learners who last did a duty can only fill the slots of other duties
+        for key in self.groups.keys() & self.slots.keys():
+            if key is not None and self.tightness(key) > self.remaining:
+                raise UnsatisfiableDutiesError(f"Too many learners last did {key} to fill its {self.slots[key]} slots with other learners")
+
+        #* Per (group, duty), the position in the group of the next candidate without history for the duty,
+        #* and a heap of the candidates with history, built once no candidates without history are left
+        self.cursors: dict[tuple, int] = {}
+        self.history_heaps: dict[tuple, list] = {}
+
+        #* Heaps of (-tightness, order, key), entries are skipped once their tightness is out of date
+        self.order = {key: position for position, key in enumerate(self.groups.keys() | self.slots.keys())}
+        self.slot_heap = [(-self.tightness(key), self.order[key], key) for key in self.slots]
+        self.group_heap = [(-self.tightness(key), self.order[key], key) for key in self.group_sizes]
+        heapq.heapify(self.slot_heap)
+        heapq.heapify(self.group_heap)
+
+    def plan(self) -> list[tuple[LearnerSummary, str]]:
+        '''Returns the `(learner, duty id)` pairs of the assignment'''
+        assignments: list[tuple[LearnerSummary, str]] = []
+
+        while self.remaining:
+            group, duty = self.next_pair()
+            index = self.take(group, duty)
+            self.assign(index, duty)
+
+            if duty is not None:
+                assignments.append((self.learners[index], duty))
+
+        return assignments
+
+    def tightness(self, key: str | None) -> int:
+        '''Returns the learners in group `key` and open slots of duty `key` combined'''
+        return self.group_sizes.get(key, 0) + self.slots.get(key, 0)
+
+    def best(self, heap: list, available: dict, exclude: tuple = ()) -> str | None:
+        '''Returns the key with the highest tightness that still has `available` entries, other than those in `exclude`'''
+        excluded = []
+        key, found = None, False
+
+        while heap:
+            entry = heap[0]
+
+            if -entry[0] != self.tightness(entry[2]) or not available.get(entry[2]):
+                heapq.heappop(heap)
+            elif entry[2] in exclude:
+                excluded.append(heapq.heappop(heap))
+            else:
+                key, found = entry[2], True
+                break
+
+        for entry in excluded:
+            heapq.heappush(heap, entry)
+
+        if not found:
+            raise UnsatisfiableDutiesError("Duties cannot be assigned without repeating a learner's last duty")
+
+        return key
+
+    def prefer_duty(self, duty: str | None, group: str | None = None) -> str | None:
+        '''Returns `duty`, or the tightest duty that is not `group` instead of leaving a learner without one'''
+        if duty is None and self.tightness(None) < self.remaining and self.duty_slots > self.slots.get(group, 0):
+            return self.best(self.slot_heap, self.slots, exclude=(None, group))
+
+        return duty
+
+    def next_pair(self) -> tuple[str | None, str | None]:
+        '''
+        Returns the group the next learner must come from, None for any group,
+        and the duty they are assigned, keeping every tight group or duty
+        satisfiable
+        '''
+        tightest_duty = self.best(self.slot_heap, self.slots)
+        tightest_group = self.best(self.group_heap, self.group_sizes)
+
+        if max(self.tightness(tightest_group), self.tightness(tightest_duty)) < self.remaining:
+            return None, self.prefer_duty(tightest_duty)
+
+        if self.tightness(tightest_group) >= self.tightness(tightest_duty):
+            return tightest_group, self.prefer_duty(self.best(self.slot_heap, self.slots, exclude=(tightest_group,)), tightest_group)
+
+        return self.best(self.group_heap, self.group_sizes, exclude=(tightest_duty,)), tightest_duty
+
+    def eligible(self, index: int, group: str | None, duty: str | None) -> bool:
+        '''Checks if the learner at `index` is unassigned and, when taken from any group, did not do `duty` last'''
+        return not self.assigned[index] and (group is not None or self.learners[index].last_duty != duty)
+
+    def without_history(self, index: int, duty: str | None) -> bool:
+        '''Checks if the learner at `index` did not do `duty` within the history window'''
+        return self.history is None or duty is None or self.history.priority(self.learner_ids[index], duty, self.window_start) is None
+
+    def take(self, group: str | None, duty: str | None) -> int:
+        '''Returns the index of the learner in `group`, or any group but `duty`'s when None, to assign `duty`'''
+        members = self.everyone if group is None else self.groups[group]
+        cursor = self.cursors.get((group, duty), len(members) - 1)
+
+        while cursor >= 0 and not (self.eligible(members[cursor], group, duty) and self.without_history(members[cursor], duty)):
+            cursor -= 1
+
+        self.cursors[(group, duty)] = cursor
+
+        if cursor >= 0:
+            return members[cursor]
+
+        heap = self.history_heap(group, duty, members)
+
+        while self.assigned[heap[0][2]]:
+            heapq.heappop(heap)
+
+        return heapq.heappop(heap)[2]
+
+    def history_heap(self, group: str | None, duty: str, members: list[int]) -> list:
+        '''Returns the heap of eligible `members` ordered by how often and how recently they did `duty`'''
+        if (group, duty) not in self.history_heaps:
+            self.history_heaps[(group, duty)] = [
+                (self.history.priority(self.learner_ids[index], duty, self.window_start), position, index)
+                for position, index in enumerate(members) if self.eligible(index, group, duty)
+            ]
+            heapq.heapify(self.history_heaps[(group, duty)])
+
+        return self.history_heaps[(group, duty)]
+
+    def assign(self, index: int, duty: str | None):
+        '''Records that the learner at `index` was assigned `duty` and updates the tightness heaps'''
+        group = self.learners[index].last_duty
+        self.assigned[index] = True
+        self.group_sizes[group] -= 1
+        self.slots[duty] -= 1
+        self.remaining -= 1
+
+        if duty is not None:
+            self.duty_slots -= 1
+
+        for key in {group, duty}:
+            if self.slots.get(key):
+                heapq.heappush(self.slot_heap, (-self.tightness(key), self.order[key], key))
+            if self.group_sizes.get(key):
+                heapq.heappush(self.group_heap, (-self.tightness(key), self.order[key], key))
+
+
+def plan_duty_assignment(
+    learners: list[LearnerSummary],
+    duties: list[dict],
+    history: DutyHistory | None = None
+) -> list[tuple[LearnerSummary, str]]:
+    '''
+    Pairs each participant slot of `duties` with a learner in `learners` who
+    was not assigned that duty last, returning the `(learner, duty id)` pairs.
+    Raises `UnsatisfiableDutiesError` when no valid assignment exists
+    '''
+    return DutyPlanner(learners, duties, history).plan()
@@ -1,23 +1,32 @@
 from pprint import pprint
-import secrets
+from time import perf_counter
 
 from beanie import PydanticObjectId
-from beanie.operators import Or
 
 from io import BytesIO
 
-from datetime import datetime
+from datetime import datetime, timedelta, date as date_type
 
 from bson.errors import InvalidId
 
-from datetime import datetime
+from pymongo import UpdateMany
+from pymongo.errors import BulkWriteError
 
 from fastapi import HTTPException, status
+from fastapi.responses import Response
 
 from models.duty import AssignedDuties, Duties
 from models.staff import Staff
-from models.learner import Learners
+from models.learner import Learners, LearnerSummary, LearnerRef
 from utils.models import DefaultDocs
+from utils.duty_history import duty_history
+from utils.duty_planner import plan_duty_assignment, UnsatisfiableDutiesError
+from utils.roster_cache import roster_cache
+from utils.clock import clock
+
+from schemas.duty import DutyRunResult
+
+from src.images import get_image, get_image_etag, ImageSize, IMAGE_CACHE_MAX_AGE
 
 
 USER_NOT_FOUND_EXCEPTION = HTTPException(
@@ -25,71 +34,267 @@ USER_NOT_FOUND_EXCEPTION = HTTPException(
                 detail="User not found"
             )
 
+IMAGE_NOT_FOUND_EXCEPTION = HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Image not found"
+            )
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    '''Checks if the `If-None-Match` header value `if_none_match` matches `etag`'''
+    if not if_none_match:
+        return False
+
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+    return "*" in tags or etag in tags
+
+
+async def get_image_response(key: str, size: ImageSize, if_none_match: str | None) -> Response:
+    '''
+    Returns the `size` version of the image `key` with caching headers, or an
+    empty 304 response without fetching the image if the client's copy is current
+    '''
+    etag = get_image_etag(key, size)
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={IMAGE_CACHE_MAX_AGE}"}
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    image = await get_image(key, size)
+
+    if not image:
+        raise IMAGE_NOT_FOUND_EXCEPTION
+
+    return Response(content=image.data, media_type=image.content_type, headers=headers)
+
+
+def get_date_key(date: datetime | date_type) -> datetime:
+    '''
+    Returns the value stored in the `date` field of `Attendance` and
+    `AssignedDuties` for `date`, which is the date at midnight
+    '''
+    return datetime(date.year, date.month, date.day)
+
+
+def get_date_query(
+    day: int | None = None,
+    weekday: int | None = None,
+    month: int | None = None,
+    year: int | None = None,
+    start: date_type | None = None,
+    end: date_type | None = None
+) -> dict:
+    '''
+    Translates the `day`, `weekday`, `month` and `year` query parameters and the
+    inclusive `start` to `end` date range into a filter on the `date` field.
+
+    `year`, `year` and `month` or a full date become a single range on `date`,
+    the remaining parts are matched with date operators on the documents
+    already within the range. Raises `ValueError` for impossible dates
+    '''
+    date_range = {}
+    date_parts = []
+
+    if year:
+        if month and day:
+            lower = datetime(year, month, day)
+            upper = lower + timedelta(days=1)
+        elif month:
+            lower = datetime(year, month, 1)
+            upper = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+        else:
+            lower = datetime(year, 1, 1)
+            upper = datetime(year + 1, 1, 1)
+
+        date_range = {"$gte": lower, "$lt": upper}
+
+    if start:
+        lower = get_date_key(start)
+        date_range["$gte"] = max(lower, date_range.get("$gte", lower))
+    if end:
+        upper = get_date_key(end) + timedelta(days=1)
+        date_range["$lt"] = min(upper, date_range.get("$lt", upper))
+
+    #* Parts not covered by the range are compared on each document
+    if month and not year:
+        date_parts.append({"$eq": [{"$month": "$date"}, month]})
+    if day and not (year and month):
+        date_parts.append({"$eq": [{"$dayOfMonth": "$date"}, day]})
+    if weekday is not None:
+        #* $isoDayOfWeek counts from Monday = 1, Python's weekday from Monday = 0
+        date_parts.append({"$eq": [{"$isoDayOfWeek": "$date"}, weekday + 1]})
+
+    query = {}
+
+    if date_range:
+        query["date"] = date_range
+    if date_parts:
+        query["$expr"] = {"$and": date_parts}
+
+    return query
+
+
+def get_page_cursor(date: datetime, id: PydanticObjectId) -> str:
+    '''Returns the `after` value that resumes a page after the document with `date` and `id`'''
+    return f"{date:%Y-%m-%d}.{id}"
+
+
+def get_page_query(after: str) -> dict:
+    '''
+    Translates the `after` cursor into a filter on documents sorted by `date`
+    then `_id` that come after it. Raises `ValueError` or `InvalidId` for
+    malformed cursors
+    '''
+    after_date, _, after_id = after.partition(".")
+    after_date = datetime.strptime(after_date, "%Y-%m-%d")
+    after_id = PydanticObjectId(after_id)
+
+    return {"$or": [
+        {"date": {"$gt": after_date}},
+        {"date": after_date, "_id": {"$gt": after_id}},
+    ]}
+
     
-async def assign_duties_to_learners(learners: list[Learners], duties: list[dict]):
+async def update_last_duties(assigned_duties: list[AssignedDuties]):
+    '''Sets `last_duty` of every learner in `assigned_duties` to their assigned duty in one bulk write'''
+    learners_per_duty: dict[str, list[PydanticObjectId]] = {}
+    
+    for assigned_duty in assigned_duties:
+        learners_per_duty.setdefault(assigned_duty.assigned_duty, []).append(assigned_duty.learner.id)
+    
+    if not learners_per_duty:
+        return
+    
+    await Learners.get_motor_collection().bulk_write(
+        [UpdateMany({"_id": {"$in": learner_ids}}, {"$set": {"last_duty": duty}}) for duty, learner_ids in learners_per_duty.items()],
+        ordered=False
+    )
+    roster_cache.set_last_duties({str(assigned_duty.learner.id): assigned_duty.assigned_duty for assigned_duty in assigned_duties})
+
+
+def build_assigned_duties(learners: list[LearnerSummary], duties: list[dict], date_key: datetime) -> list[AssignedDuties]:
     '''
-    Assigns `duties` to `learners`
+    Plans the assignment of `duties` to `learners` for `date_key` without saving
+    it, using the loaded duty history. Raises `UnsatisfiableDutiesError` if
+    duties cannot be assigned without repeating a learner's last duty
     '''
-    assigned_duties: list[AssignedDuties] = []
-    current_date = datetime.now()
-        
-    for duty in duties:
+    return [
+        AssignedDuties(
+            learner=LearnerRef(id=learner.id, block=learner.block),
+            assigned_duty=duty,
+            date=date_key,
+            completed=False
+        )
+        for learner, duty in plan_duty_assignment(learners, duties, duty_history)
+    ]
+
+
+async def persist_assigned_duties(assigned_duties: list[AssignedDuties], date_key: datetime) -> int:
+    '''
+    Saves `assigned_duties` with one insert and updates the learners' `last_duty`
+    with one bulk write, returning the number of duties assigned
+    '''
+    if not assigned_duties:
+        return 0
+    
+    try:
+        await AssignedDuties.insert_many(assigned_duties, ordered=False)
+    except BulkWriteError as e:
+        #* A concurrent run assigned some learners first, the unique index rejected the duplicates
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
         
-        while not duty["participants"] == 0:
-            random_learner = secrets.choice(learners)
-            
-            #* Ensure learners are not assigned duties they were assigned previously
-            while random_learner.last_duty == duty.get("id"):
-                random_learner = secrets.choice(learners)
-            
-            assigned_duties.append(AssignedDuties(
-                learner_details=random_learner.model_dump(exclude=["present", "image"]),
-                assigned_duty=duty.get("id"),
-                week_day=current_date.weekday(),
-                day=current_date.day,
-                month=current_date.month,
-                year=current_date.year,
-                completed=False
-            ))
-         
-            duty["participants"] -= 1 #* Update participants for duty
-            learners.remove(random_learner) #* Remove learner, to avoid multiple duty assignment
-    
-    for duty in assigned_duties:
-        await duty.save()
-
-
-async def assign_saturday_duties():
-    """Assigns Saturday duties"""
-    duties_in_db = Duties.find_many()
-    duties = [] #* Convert Duties documents to dictionaries
+        assigned_duties = await AssignedDuties.find(AssignedDuties.date == date_key).to_list()
+        await duty_history.load()
+    else:
+        duty_history.record(assigned_duties)
+    
+    await update_last_duties(assigned_duties)
+    
+    return len(assigned_duties)
+
+
+async def assign_duties_to_learners(learners: list[LearnerSummary], duties: list[dict]) -> int:
+    '''
+    Assigns `duties` to `learners`, ensuring learners are not assigned the duty
+    they were assigned previously, and returns the number of duties assigned.
+    Duties go to the learners who did them least often and least recently.
+    Raises `UnsatisfiableDutiesError` if that is not possible.
+
+    Safe to rerun: if duties were already assigned today they are kept and
+    only learners' `last_duty` is brought in line with them
+    '''
+    date_key = clock.date_key()
+    
+    assigned_today = await AssignedDuties.find(AssignedDuties.date == date_key).to_list()
+    
+    if assigned_today:
+        await update_last_duties(assigned_today)
+        return 0
+    
+    await duty_history.ensure_loaded()
     
+    return await persist_assigned_duties(build_assigned_duties(learners, duties, date_key), date_key)
+
+
+async def assign_saturday_duties(dry_run: bool = False) -> DutyRunResult:
+    """
+    Assigns Saturday duties, reporting how many learners were assigned a duty
+    and how long fetching, assigning and persisting took. With `dry_run` the
+    planned assignment is returned instead of saved
+    """
+    result = DutyRunResult()
+    date_key = clock.date_key()
+    
+    started = perf_counter()
+    duties = [duty.model_dump() for duty in await Duties.find_many().to_list()] #* Convert Duties documents to dictionaries
     default_duty = await DefaultDocs.find_one(DefaultDocs.id == "total-participants")
+    learners = await Learners.find(Learners.present == True).project(LearnerSummary).to_list()
+    already_assigned = await AssignedDuties.find(AssignedDuties.date == date_key).count()
+    await duty_history.ensure_loaded()
+    result.timings["fetch"] = perf_counter() - started
     
-    learners = await Learners.find(Learners.present == True).to_list()
-        
-    async for duty in duties_in_db:
-        duties.append(duty.model_dump())
-        
+    if already_assigned:
+        result.status, result.message = "skipped", "Duties were already assigned today"
+        return result
     
     if not len(learners) == default_duty.total:
-        return
+        result.status = "skipped"
+        result.message = f"{len(learners)} learners are present but duties need {default_duty.total} participants"
+        return result
+    
+    started = perf_counter()
+    
+    try:
+        assigned_duties = build_assigned_duties(learners, duties, date_key)
+    except UnsatisfiableDutiesError as e:
+        result.status, result.message = "skipped", str(e)
+        return result
+    
+    result.timings["assign"] = perf_counter() - started
     
-    await assign_duties_to_learners(learners, duties)
+    if dry_run:
+        result.learners_assigned = len(assigned_duties)
+        names = {learner.id: learner for learner in learners}
+        result.plan = [
+            {"learner_id": str(duty.learner.id), "first_name": names[duty.learner.id].first_name, "last_name": names[duty.learner.id].last_name, "assigned_duty": duty.assigned_duty}
+            for duty in assigned_duties
+        ]
+        return result
+    
+    started = perf_counter()
+    result.learners_assigned = await persist_assigned_duties(assigned_duties, date_key)
+    result.timings["persist"] = perf_counter() - started
+    
+    return result
 
 
-async def get_learners_in_blocks(first_block: str, second_block:str):
+async def get_learners_in_blocks(*blocks: str) -> list[dict]:
     '''
-    Retrieves all learners in `block1` and `block2`
-    which a `sr-matron` or `jr-matron` may be in charge of
+    Retrieves all learners in `blocks` which a `sr-matron` or
+    `jr-matron` may be in charge of, served from the roster cache
     '''
-    learners: list[dict] = []
-    learners_in_db = await Learners.find(Or(Learners.block == first_block, Learners.block == second_block)).to_list()
-    
-    for learner in learners_in_db:
-        learners.append(learner.model_dump(exclude=["image"]))
-    
-    return learners
+    return await roster_cache.get_blocks(blocks)
 
 
 async def get_learner_or_staff(id: str) -> Staff | Learners | None:
@@ -0,0 +1,60 @@
+"""Helpers shared by the database migrations in `migrations/`
+
+The runner creates the indexes declared on every document model a migration
+lists before running it, so migrations that reshape rows list the index-free
+documents here instead of the application's models
+"""
+
+from beanie import Document
+
+
+class AttendanceRows(Document):
+    '''The `Attendance` collection without the model's fields or indexes'''
+
+    class Settings:
+        name = "Attendance"
+
+
+class AssignedDutiesRows(Document):
+    '''The `AssignedDuties` collection without the model's fields or indexes'''
+
+    class Settings:
+        name = "AssignedDuties"
+
+
+async def drop_secondary_indexes(collection, session=None):
+    '''Drops every index on `collection` except the one on `_id`'''
+    for name in await collection.index_information(session=session):
+        if name != "_id_":
+            await collection.drop_index(name, session=session)
+
+
+async def remove_duplicates(collection, keys: list[str], keep: dict, session=None, batch_size: int = 1000) -> int:
+    '''
+    Deletes all but one document of every group in `collection` sharing the
+    values of `keys`, keeping the first by the `keep` sort. Returns the number
+    of documents deleted
+    '''
+    pipeline = [
+        {"$sort": keep},
+        {"$group": {
+            "_id": {key.replace(".", "_"): f"${key}" for key in keys},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    duplicates = []
+    removed = 0
+
+    async for group in collection.aggregate(pipeline, allowDiskUse=True, session=session):
+        duplicates.extend(group["ids"][1:])
+
+        if len(duplicates) >= batch_size:
+            removed += (await collection.delete_many({"_id": {"$in": duplicates}}, session=session)).deleted_count
+            duplicates = []
+
+    if duplicates:
+        removed += (await collection.delete_many({"_id": {"$in": duplicates}}, session=session)).deleted_count
+
+    return removed
@@ -10,7 +10,7 @@ from beanie import Document
 class UserBaseModel(BaseModel):
     first_name: Annotated[str, Field(min_length=2, max_length=20, examples=['John'])]
     last_name: Annotated[str, Field(min_length=2, max_length=20, examples=['Doe'])]
-    image: Annotated[bytes, Field(description="A dictionary with information about the user's picture", alias="image")]
+    image: Annotated[str, Field(description="Key of the user's picture in the image store", alias="image")]
     
     
 class DefaultDocs(Document):
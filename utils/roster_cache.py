@@ -0,0 +1,215 @@
+"""In-memory roster of learner summaries per block"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from models.learner import Learners, LearnerSummary
+
+from utils.cache import CACHES
+
+
+logger = logging.getLogger(__name__)
+
+#* Error code of `$changeStream` on a server that is not a replica set
+CHANGE_STREAMS_UNSUPPORTED = 40573
+
+
+class RosterCache:
+    '''
+    Summaries of every learner grouped by block, built from `Learners` with
+    one query and kept current by a change stream on `Learners`.
+
+    Where change streams are unavailable the write hooks `add`, `set_last_duties`
+    and `invalidate` keep it current instead, and it is rebuilt once older than
+    `max_age` to pick up writes made by other workers
+    '''
+
+    def __init__(self, max_age: timedelta, retry_after: float):
+        self.max_age = max_age
+        self.retry_after = retry_after
+        self.loaded_at: datetime | None = None
+        self.watching = False
+        self.hits = 0
+        self.misses = 0
+        self._learners: dict[str, dict[str, LearnerSummary]] = {}
+        self._dumps: dict[str, list[dict]] = {}
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        '''Rebuilds the roster from every learner in the database'''
+        learners: dict[str, dict[str, LearnerSummary]] = {}
+
+        for learner in await Learners.find_all().project(LearnerSummary).to_list():
+            learners.setdefault(learner.block, {})[str(learner.id)] = learner
+
+        self._learners = learners
+        self._dumps = {}
+        self.loaded_at = datetime.now()
+
+    def is_stale(self) -> bool:
+        '''Checks if the roster must be rebuilt before it is read'''
+        if self.loaded_at is None:
+            return True
+
+        return not self.watching and datetime.now() - self.loaded_at > self.max_age
+
+    async def ensure_loaded(self):
+        '''Loads the roster if it was never loaded, was invalidated or is stale'''
+        if not self.is_stale():
+            self.hits += 1
+            return
+
+        self.misses += 1
+
+        #* Concurrent readers wait for a single load instead of each querying
+        async with self._lock:
+            if self.is_stale():
+                await self.load()
+
+    async def get_learners(self, blocks: tuple[str, ...]) -> list[LearnerSummary]:
+        '''Returns the summaries of every learner in `blocks`'''
+        await self.ensure_loaded()
+
+        return [learner for block in blocks for learner in self._learners.get(block, {}).values()]
+
+    async def get_blocks(self, blocks: tuple[str, ...]) -> list[dict]:
+        '''Returns the summaries of every learner in `blocks` as dictionaries'''
+        await self.ensure_loaded()
+        learners = []
+
+        for block in blocks:
+            if block not in self._dumps:
+                self._dumps[block] = [learner.model_dump() for learner in self._learners.get(block, {}).values()]
+
+            learners.extend(self._dumps[block])
+
+        return learners
+
+    def find(self, learner_id: str, block: str | None = None) -> LearnerSummary | None:
+        '''Returns the learner with `learner_id`, looking in `block` first'''
+        learner = self._learners.get(block, {}).get(learner_id)
+
+        if learner is None:
+            learner = next((learners[learner_id] for learners in self._learners.values() if learner_id in learners), None)
+
+        return learner
+
+    def expand(self, row: dict) -> dict:
+        '''
+        Replaces the compact `learner` reference of a serialized `Attendance` or
+        `AssignedDuties` row with `learner_details` including the learner's
+        names, grade, room and last duty. Call `ensure_loaded` before expanding rows
+        '''
+        reference = row.pop("learner")
+        learner = self.find(reference["id"], reference["block"])
+        details = learner.model_dump(include={"first_name", "last_name", "grade", "room", "last_duty"}) if learner else {}
+        row["learner_details"] = {**reference, **details}
+
+        return row
+
+    def put(self, learner: LearnerSummary):
+        '''Adds or replaces `learner`, moving them if their block changed'''
+        learner_id = str(learner.id)
+        self.remove(learner_id)
+        self._learners.setdefault(learner.block, {})[learner_id] = learner
+        self._dumps.pop(learner.block, None)
+
+    def remove(self, learner_id: str):
+        '''Removes the learner with `learner_id` from whichever block they are in'''
+        for block, learners in self._learners.items():
+            if learners.pop(learner_id, None):
+                self._dumps.pop(block, None)
+                return
+
+    def invalidate(self):
+        '''Drops the roster so the next read rebuilds it'''
+        self.loaded_at = None
+
+    def add(self, learners: list[Learners]):
+        '''Write hook for newly saved `learners`'''
+        if self.watching or self.loaded_at is None:
+            return
+
+        for learner in learners:
+            self.put(LearnerSummary(**learner.model_dump(include=set(LearnerSummary.model_fields))))
+
+    def set_last_duties(self, last_duties: dict[str, str]):
+        '''Write hook for `last_duty` updates, mapping learner IDs to their duty'''
+        if self.watching or self.loaded_at is None:
+            return
+
+        for block, learners in self._learners.items():
+            for learner_id, duty in last_duties.items():
+                if learner_id in learners:
+                    learners[learner_id].last_duty = duty
+                    self._dumps.pop(block, None)
+
+    def apply(self, change: dict):
+        '''Applies a change stream event on `Learners` to the roster'''
+        operation = change["operationType"]
+
+        if operation in ("insert", "replace", "update"):
+            document = change.get("fullDocument")
+
+            if document is None:
+                #* Deleted before the update could be looked up, a delete event follows
+                self.remove(str(change["documentKey"]["_id"]))
+            else:
+                self.put(LearnerSummary.model_validate(document))
+        elif operation == "delete":
+            self.remove(str(change["documentKey"]["_id"]))
+        else:
+            self.invalidate()
+
+    async def watch(self):
+        '''
+        Keeps the roster current from a change stream on `Learners` until
+        cancelled, reconnecting after errors. Returns if the server does not
+        support change streams, leaving the write hooks to keep it current
+        '''
+        while True:
+            try:
+                async with Learners.get_motor_collection().watch(full_document="updateLookup") as stream:
+                    #* Reload once the stream is open so no change between the two is missed
+                    await self.load()
+                    self.watching = True
+
+                    async for change in stream:
+                        self.apply(change)
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    logger.info("Change streams are unavailable, the learner roster relies on write hooks")
+                    return
+
+                logger.exception("Learner roster change stream failed")
+            except PyMongoError:
+                logger.exception("Learner roster change stream failed")
+            finally:
+                self.watching = False
+
+            await asyncio.sleep(self.retry_after)
+
+    def stats(self) -> dict:
+        '''Returns the size and hit/miss counters of the roster'''
+        lookups = self.hits + self.misses
+
+        return {
+            "name": "learner-roster",
+            "size": sum(len(learners) for learners in self._learners.values()),
+            "max_size": None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "watching": self.watching
+        }
+
+
+roster_cache = RosterCache(
+    max_age=timedelta(seconds=int(os.getenv("ROSTER_CACHE_MAX_AGE_SECONDS", 300))),
+    retry_after=float(os.getenv("ROSTER_CACHE_RETRY_SECONDS", 5))
+)
+CACHES["learner-roster"] = roster_cache
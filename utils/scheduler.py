@@ -0,0 +1,106 @@
+"""Runs scheduled jobs on exactly one worker and records each run"""
+
+import os
+import socket
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from pymongo.errors import DuplicateKeyError
+
+from models.scheduler import SchedulerLocks, JobRuns
+
+from utils.schemas import JobResult
+from utils.clock import clock
+
+
+logger = logging.getLogger(__name__)
+
+#* Identifies this process among every worker and replica sharing the database
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+DUTY_ASSIGNMENT_JOB = "assign-saturday-duties"
+RECONCILE_TOTALS_JOB = "reconcile-totals"
+
+
+async def acquire_lock(name: str, ttl: timedelta) -> bool:
+    '''
+    Acquires the lock `name` for `ttl` unless another worker holds it.
+    Locks past their expiry are taken over even before MongoDB removes them
+    '''
+    now = datetime.now(timezone.utc)
+    
+    try:
+        await SchedulerLocks.get_motor_collection().update_one(
+            {"_id": name, "expires_at": {"$lte": now}},
+            {"$set": {"owner": WORKER_ID, "acquired_at": now, "expires_at": now + ttl}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False    #* The lock exists and has not expired
+    
+    return True
+
+
+async def release_lock(name: str):
+    '''Releases the lock `name` if this worker holds it'''
+    await SchedulerLocks.get_motor_collection().delete_one({"_id": name, "owner": WORKER_ID})
+
+
+async def record_job_run(
+    job_name: str,
+    run_key: str,
+    job: Callable[[], Awaitable[JobResult]],
+    trigger: str = "schedule",
+    dry_run: bool = False
+) -> tuple[JobRuns, JobResult | None]:
+    '''
+    Runs `job` and records the run in `JobRuns`, returning the record
+    and the job's result, which is None if the job failed
+    '''
+    job_run = JobRuns(job=job_name, run_key=run_key, owner=WORKER_ID, trigger=trigger, dry_run=dry_run, started_at=datetime.now(timezone.utc))
+    await job_run.insert()
+    result = None
+    
+    try:
+        result = await job()
+        job_run.status = result.status
+        job_run.message = result.message
+        job_run.learners_assigned = result.learners_assigned
+        job_run.timings = result.timings
+    except Exception as e:
+        logger.exception("Job %s failed", job_name)
+        job_run.status = "failed"
+        job_run.message = str(e)
+    finally:
+        job_run.finished_at = datetime.now(timezone.utc)
+        job_run.duration_seconds = (job_run.finished_at - job_run.started_at).total_seconds()
+        await job_run.save()
+    
+    return job_run, result
+
+
+async def run_scheduled_job(job_name: str, job: Callable[[], Awaitable[JobResult]]):
+    '''
+    Runs `job` for today's scheduled run of `job_name` if no other worker has,
+    recording the run in `JobRuns`.
+
+    The lock for a successful run is kept until it expires so workers whose
+    scheduler fires later than the first skip the run instead of repeating it.
+    Runs that skipped or failed release it, as manual runs do
+    '''
+    run_key = clock.today().isoformat()
+    lock_name = f"{job_name}:{run_key}"
+    
+    if not await acquire_lock(lock_name, ttl=timedelta(days=1)):
+        return
+    
+    succeeded = False
+    
+    try:
+        job_run, _ = await record_job_run(job_name, run_key, job)
+        succeeded = job_run.status == "succeeded"
+    finally:
+        if not succeeded:
+            #* Nothing was done, let a manual run or another worker try again today
+            await release_lock(lock_name)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, field_validator, model_validator, field_validator
 
-from typing import Annotated
+from typing import Annotated, Literal
 
 
 class UserBaseSchema(BaseModel):
@@ -10,4 +10,20 @@ class UserBaseSchema(BaseModel):
     
 class GenericResponse(BaseModel):
     status: str = "success"
-    message: str = "Action completed successfully"
\ No newline at end of file
+    message: str = "Action completed successfully"
+
+
+class JobResult(BaseModel):
+    """
+    Outcome of a run of a scheduled job
+
+    ## Attributes:
+    - status (str): `succeeded`, or `skipped` if the job could not or need not run
+    - message (str): Details about the run, such as why it was skipped
+    - learners_assigned (int): Number of learners assigned, or planned to be assigned, a duty
+    - timings (dict): Seconds spent per phase of the job
+    """
+    status: Literal["succeeded", "skipped"] = "succeeded"
+    message: str = ""
+    learners_assigned: int = 0
+    timings: dict[str, float] = {}